@@ -0,0 +1,208 @@
+"""
+Scaling benchmarks for the daqconf tools.
+
+Each benchmark runs an operation for increasing problem sizes and prints the
+time taken, together with the time per item, to check how the cost scales.
+"""
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+
+
+def report_scaling(title: str, results: list[tuple[int, float]]) -> None:
+    """Print a table of (size, seconds) measurements"""
+    print(title)
+    print(f"{'size':>10} {'time [s]':>10} {'per item [us]':>14}")
+    for size, seconds in results:
+        print(f"{size:>10} {seconds:>10.3f} {seconds / size * 1e6:>14.1f}")
+
+    if len(results) > 1:
+        (n_first, t_first), (n_last, t_last) = results[0], results[-1]
+        ratio = (t_last / n_last) / (t_first / n_first)
+        print(f"Per-item cost ratio largest/smallest size: {ratio:.2f} (1.0 = linear scaling)")
+
+
+def benchmark_hwmap(sizes=(1000, 2000, 5000, 10000), n_apps=10, commit_interval=0, output_dir=None):
+    """Time generate_hwmap for an increasing total number of streams, split
+    over n_apps DetectorToDaqConnections"""
+    from daqconf.generate_hwmap import generate_hwmap
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmpdir:
+        for size in sizes:
+            oksfile = os.path.join(tmpdir, f"hwmap-{size}.data.xml")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_hwmap(oksfile, size // n_apps, n_apps=n_apps, commit_interval=commit_interval)
+            results.append((size, time.perf_counter() - start))
+
+    report_scaling(f"generate_hwmap: {n_apps} connections, commit_interval={commit_interval}", results)
+    return results
+
+
+def benchmark_consolidate(sizes=(10000, 50000, 100000), n_inputs=2, output_dir=None):
+    """Time consolidate_files merging n_inputs identical hardware map databases
+    of roughly `size` objects each, so that all the objects of the first input
+    are copied and all the objects of the others are found to be present"""
+    from daqconf.consolidate import consolidate_files
+    from daqconf.generate_hwmap import generate_hwmap
+
+    n_apps = 10
+    results = []
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmpdir:
+        for size in sizes:
+            input_files = []
+            for i in range(n_inputs):
+                # Each stream adds a GeoId, a DetectorStream and a FakeDataSender
+                input_file = os.path.join(tmpdir, f"consolidate-{size}-{i}.data.xml")
+                with contextlib.redirect_stdout(io.StringIO()):
+                    generate_hwmap(input_file, size // (3 * n_apps), n_apps=n_apps)
+                input_files.append(input_file)
+
+            oksfile = os.path.join(tmpdir, f"consolidated-{size}.data.xml")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                copied = consolidate_files(oksfile, *input_files)
+            results.append((copied, time.perf_counter() - start))
+
+    report_scaling(f"consolidate_files: {n_inputs} input databases, size = objects copied", results)
+    return results
+
+
+class _SyntheticDal:
+    """Minimal stand-in for a dal object, as used by the textual_dbe graph code"""
+
+    def __init__(self, uid: str, class_name: str):
+        self.id = uid
+        self._class_name = class_name
+        self.contains = []
+
+    def className(self):
+        return self._class_name
+
+
+class _SyntheticHandler:
+    """Stand-in for a textual_dbe ConfigurationHandler holding a synthetic
+    configuration: a tree with fan-out `fanout`, where every object also
+    references a few objects further down the tree"""
+
+    def __init__(self, n_objects: int, fanout: int = 4, n_extra: int = 2, seed: int = 1):
+        import random
+        rng = random.Random(seed)
+        self.version = 0
+        self._loaded_dals = [_SyntheticDal(f"obj-{i}", "Session" if i == 0 else "Component") for i in range(n_objects)]
+        for i, dal in enumerate(self._loaded_dals):
+            children = list(range(i * fanout + 1, min((i + 1) * fanout + 1, n_objects)))
+            if i + 1 < n_objects:
+                children += [rng.randrange(i + 1, n_objects) for _ in range(n_extra)]
+            dal.contains = [self._loaded_dals[j] for j in children]
+
+    @property
+    def conf_obj_list(self):
+        return self._loaded_dals
+
+    @property
+    def n_dals(self) -> int:
+        return len(self._loaded_dals)
+
+    def get_relationships_for_conf_object(self, conf_object):
+        return [{"contains": conf_object.contains}]
+
+
+def benchmark_relational_graph(sizes=(1000, 10000, 50000)):
+    """Time building the textual_dbe RelationalGraph for synthetic
+    configurations of increasing numbers of objects"""
+    from daqconf.textual_dbe.data_structures.relational_graph import RelationalGraph
+
+    results = []
+    for size in sizes:
+        handler = _SyntheticHandler(size)
+        start = time.perf_counter()
+        graph = RelationalGraph(handler)
+        results.append((size, time.perf_counter() - start))
+        assert len(graph.top_level_nodes) == 1
+
+    report_scaling("RelationalGraph construction", results)
+    return results
+
+
+def write_synthetic_readout_map(path: str, n_entries: int, eth_fraction: float = 0.5,
+                                links_per_sender: int = 16, senders_per_nic: int = 4, links_per_slr: int = 24) -> None:
+    """Write a JSON readout map of n_entries links, grouped by rx/tx NIC (eth)
+    and by FELIX card/SLR (flx) as in real maps. Entries are written one at a
+    time, so that the map itself is never held in memory."""
+    n_eth = int(n_entries * eth_fraction)
+    with open(path, "w") as f:
+        f.write("[\n")
+        for i in range(n_entries):
+            geo_id = {"det_id": 3, "crate_id": i // 400, "slot_id": (i // 40) % 10, "stream_id": i % 40}
+            if i < n_eth:
+                tx = i // links_per_sender
+                rx = tx // senders_per_nic
+                kind = "eth"
+                pars = {
+                    "protocol": "udp", "mode": "fix_rate",
+                    "rx_iface": 0, "rx_host": f"rx-host-{rx}", "rx_mac": f"00:00:00:{rx >> 16 & 255:02x}:{rx >> 8 & 255:02x}:{rx & 255:02x}",
+                    "rx_ip": f"10.0.{rx >> 8 & 255}.{rx & 255}",
+                    "tx_host": f"tx-host-{tx // 2}", "tx_mac": f"00:01:00:{tx >> 16 & 255:02x}:{tx >> 8 & 255:02x}:{tx & 255:02x}",
+                    "tx_ip": f"10.1.{tx >> 8 & 255}.{tx & 255}",
+                }
+            else:
+                j = i - n_eth
+                kind = "flx"
+                pars = {"protocol": "full", "mode": "fix_rate", "card": j // (2 * links_per_slr),
+                        "slr": (j // links_per_slr) % 2, "link": j % links_per_slr}
+            entry = {"src_id": i, "geo_id": geo_id, "kind": kind, "parameters": pars}
+            f.write(("" if i == 0 else ",\n") + json.dumps(entry))
+        f.write("\n]\n")
+
+
+def benchmark_dromap(sizes=(500000,), convert=False, output_dir=None):
+    """Compare reading synthetic JSON readout maps whole, as dro_json_to_oks
+    does, with the incremental parsing and grouping of the streaming mode.
+    Times are measured first, then the peak Python memory in a second pass.
+    With convert=True the full streaming conversion to OKS is also timed."""
+    import tracemalloc
+    from daqconf.dromap2oks import iter_json_array, group_readout_map, dro_json_to_oks_streaming
+
+    def read_whole(path):
+        with open(path) as f:
+            return len(json.loads(f.read()))
+
+    def read_streaming(path):
+        with open(path) as f:
+            return sum(1 for _ in group_readout_map(iter_json_array(f)))
+
+    results = {"json.loads": [], "streaming": [], "conversion": []}
+    with tempfile.TemporaryDirectory(dir=output_dir) as tmpdir:
+        for size in sizes:
+            path = os.path.join(tmpdir, f"romap-{size}.json")
+            write_synthetic_readout_map(path, size)
+            print(f"Map of {size} entries: {os.path.getsize(path) / 2**20:.1f} MiB")
+
+            for mode, read in (("json.loads", read_whole), ("streaming", read_streaming)):
+                start = time.perf_counter()
+                read(path)
+                results[mode].append((size, time.perf_counter() - start))
+
+                tracemalloc.start()
+                read(path)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"  {mode:<12} peak memory {peak / 2**20:8.1f} MiB")
+
+            if convert:
+                oksfile = os.path.join(tmpdir, f"romap-{size}.data.xml")
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    dro_json_to_oks_streaming(path, oksfile, 0, "1,2,3,4")
+                results["conversion"].append((size, time.perf_counter() - start))
+
+    report_scaling("Readout map, whole file json.loads", results["json.loads"])
+    report_scaling("Readout map, streaming parsing and grouping", results["streaming"])
+    if convert:
+        report_scaling("Readout map, streaming conversion to OKS", results["conversion"])
+    return results
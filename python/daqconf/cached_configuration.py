@@ -0,0 +1,95 @@
+import conffwk
+
+
+class MissingObjectsError(RuntimeError):
+    """Raised by CachedConfiguration.prefetch when some of the requested objects
+    are not available in the configuration"""
+
+    def __init__(self, missing: list[tuple[str, str]]):
+        self.missing = missing
+        super().__init__(
+            f"{len(missing)} expected object(s) not found in input databases: "
+            + ", ".join(f"{uid}@{class_name}" for class_name, uid in missing)
+        )
+
+
+class CachedConfiguration:
+    """Memoising layer in front of a conffwk.Configuration.
+
+    get_dal lookups are cached by (class name, uid), so that the template
+    objects the generators reference over and over (rules, services, opmon
+    configuration, ...) are converted to dal objects only once.
+    update_dal and destroy_dal drop the cached entries of the object they
+    are given; invalidate() can be used to drop the whole cache after
+    modifying objects through any other route.
+
+    Any other attribute is forwarded to the wrapped Configuration.
+    """
+
+    def __init__(self, db: conffwk.Configuration):
+        self._db = db
+        self._dals = {}
+        # uid -> set of (class name, uid) keys cached for that object
+        self._keys_by_uid = {}
+
+    def get_dal(self, class_name: str, uid: str):
+        key = (class_name, uid)
+        try:
+            return self._dals[key]
+        except KeyError:
+            pass
+
+        dal = self._db.get_dal(class_name=class_name, uid=uid)
+        self._dals[key] = dal
+        self._keys_by_uid.setdefault(uid, set()).add(key)
+        return dal
+
+    def prefetch(self, objects: dict[str, tuple[str, str]]) -> dict:
+        """Look up a set of objects in one go
+
+        Arguments:
+            objects -- dictionary of name : (class name, uid)
+
+        Returns:
+            dictionary of name : dal object
+
+        Raises:
+            MissingObjectsError listing all the objects that could not be found
+        """
+        found = {}
+        missing = []
+        for name, (class_name, uid) in objects.items():
+            try:
+                found[name] = self.get_dal(class_name, uid)
+            except RuntimeError:
+                missing.append((class_name, uid))
+
+        if missing:
+            raise MissingObjectsError(missing)
+        return found
+
+    def invalidate(self, uid: str = None) -> None:
+        """Drop the cached dal objects for uid, or the whole cache if uid is None"""
+        if uid is None:
+            self._dals.clear()
+            self._keys_by_uid.clear()
+            return
+
+        for key in self._keys_by_uid.pop(uid, ()):
+            self._dals.pop(key, None)
+
+    def update_dal(self, dal_obj, *args, **kwargs):
+        self.invalidate(dal_obj.id)
+        return self._db.update_dal(dal_obj, *args, **kwargs)
+
+    def destroy_dal(self, dal_obj, *args, **kwargs):
+        self.invalidate(dal_obj.id)
+        return self._db.destroy_dal(dal_obj, *args, **kwargs)
+
+    @property
+    def configuration(self) -> conffwk.Configuration:
+        """The wrapped configuration"""
+        return self._db
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
@@ -2,24 +2,141 @@ from pathlib import Path
 import conffwk
 import sys
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from daqconf.dal_helpers import find_related
+from daqconf.graph_utils import topological_order
+from daqconf.utils import resolve_db_path
+
+
+class IncludeGraph:
+    """Include hierarchy of a configuration.
+
+    Starting from `root` (None stands for the top level file(s) of the
+    configuration), get_includes is called once for every data file reached,
+    however many files include it. Schema files are leaves of the graph.
+    """
+
+    def __init__(self, db, root=None):
+        self._root = root
+        # file -> files it includes directly
+        self._includes = {}
+        # file -> files including it directly
+        self._included_by = {}
+
+        stack = [root]
+        while stack:
+            file = stack.pop()
+            if file in self._includes:
+                continue
+            includes = list(db.get_includes(file)) if file == root or "data.xml" in file else []
+            self._includes[file] = includes
+            for include in includes:
+                self._included_by.setdefault(include, []).append(file)
+                if include not in self._includes:
+                    stack.append(include)
+
+        self._order = topological_order(self._includes)
+
+    @property
+    def root(self):
+        return self._root
+
+    @property
+    def files(self) -> list:
+        """All the files reached from the root, the root excluded"""
+        return [f for f in self._includes if f is not self._root]
+
+    def includes(self, file=None) -> list:
+        """Files directly included by file (default: the root)"""
+        return self._includes.get(self._root if file is None else file, [])
+
+    def all_includes(self, file=None) -> list:
+        """Files included by file (default: the root), directly or not"""
+        start = self._root if file is None else file
+        seen = set()
+        stack = list(self._includes.get(start, []))
+        while stack:
+            include = stack.pop()
+            if include in seen:
+                continue
+            seen.add(include)
+            stack += self._includes.get(include, [])
+        return [f for f in self._includes if f in seen]
+
+    def included_by(self, file) -> list:
+        """Files that directly include file"""
+        return self._included_by.get(file, [])
+
+    def all_included_by(self, file) -> list:
+        """Files that include file, directly or not"""
+        seen = set()
+        stack = list(self._included_by.get(file, []))
+        while stack:
+            parent = stack.pop()
+            if parent in seen:
+                continue
+            seen.add(parent)
+            stack += self._included_by.get(parent, [])
+        return [f for f in self._includes if f in seen]
+
+    def topological_order(self, includes_first: bool = True) -> list:
+        """All the files, root included, each one after the files it includes
+        (or before them if includes_first is False)"""
+        order = self._order.order
+        return list(reversed(order)) if includes_first else list(order)
+
+    def resolve_paths(self, root_file) -> dict:
+        """Absolute paths of all the files in the graph
+
+        Arguments:
+            root_file -- path of the file the root of the graph stands for
+
+        Returns:
+            dictionary of file : absolute path, the root included
+        """
+        resolved = {self._root: os.path.realpath(root_file)}
+        for file in self.topological_order(includes_first=False):
+            for include in self._includes.get(file, []):
+                if include not in resolved and file in resolved:
+                    resolved[include] = resolve_db_path(include, os.path.dirname(resolved[file]))
+        return resolved
+
+    @property
+    def cycles(self) -> list[list]:
+        """Groups of files including each other"""
+        return self._order.cycles
 
 
 def get_all_includes(db, file):
-    includes = db.get_includes(file)
-    for include in includes:
-        if "data.xml" in include:
-            includes += get_all_includes(db, include)
+    return IncludeGraph(db, file).all_includes()
 
-    return list(set(includes))
 
+def _database_size(graph, oksfile):
+    """Total size in bytes of oksfile and the data files it includes"""
+    files = [path for file, path in graph.resolve_paths(oksfile).items() if file is None or "data.xml" in file]
+    return sum(os.path.getsize(f) for f in set(files) if os.path.isfile(f))
 
-def consolidate_db(oksfile, output_file):
+
+def consolidate_db(oksfile, output_file, session_name=None):
+    """Copy all the objects of oksfile, and of the data files it includes,
+    into output_file, which only includes the schema files.
+
+    If session_name is given, only the Session of that name and the objects
+    reachable from it are copied, and the reduction in number of objects,
+    file size and load time is reported.
+    """
     sys.setrecursionlimit(10000)  # for example
     print("Reading database")
+    start = time.perf_counter()
     db = conffwk.Configuration("oksconflibs:" + oksfile)
+    load_time = time.perf_counter() - start
 
     schemafiles = []
-    includes = get_all_includes(db, None)
+    graph = IncludeGraph(db)
+    includes = graph.all_includes()
     schemafiles += [i for i in includes if "schema.xml" in i]
     print(f"Included schemas: {schemafiles}")
 
@@ -31,6 +148,14 @@ def consolidate_db(oksfile, output_file):
 
     print("Reading dal objects from old db")
     dals = db.get_all_dals()
+    n_input_dals = len(dals)
+
+    if session_name is not None:
+        print(f"Selecting objects reachable from session {session_name}")
+        session = db.get_dal(class_name="Session", uid=session_name)
+        session_objs = {session}
+        find_related(session, session_objs)
+        dals = {f"{d.id}@{d.className()}": d for d in session_objs}
 
     print(f"Copying objects to new db")
     for dal in dals:
@@ -43,50 +168,159 @@ def consolidate_db(oksfile, output_file):
 
     print("Saving database")
     new_db.commit()
+
+    if session_name is not None:
+        input_size = _database_size(graph, oksfile)
+        output_size = os.path.getsize(output_file)
+        start = time.perf_counter()
+        conffwk.Configuration("oksconflibs:" + output_file)
+        output_load_time = time.perf_counter() - start
+
+        print(f"Objects:   {n_input_dals} -> {len(dals)} ({100 * (1 - len(dals) / max(n_input_dals, 1)):.1f}% fewer)")
+        print(f"Data size: {input_size / 1024:.1f} kB -> {output_size / 1024:.1f} kB ({100 * (1 - output_size / max(input_size, 1)):.1f}% smaller)")
+        print(f"Load time: {load_time:.2f} s -> {output_load_time:.2f} s ({100 * (1 - output_load_time / max(load_time, 1e-9)):.1f}% faster)")
+
     print("DONE")
 
-def copy_configuration(dest_dir : Path, input_files: list):
+# Below this number of files, the pool costs more than it saves
+_POOL_MIN_FILES = 8
+
+
+def _copy_file(source, output_file, includes):
+    """Copy the objects of one database file to output_file, which includes the given files
+
+    Only the objects defined in source itself are copied: the objects of the
+    files it includes are in the outputs of the previous levels, and may be
+    written by other workers.
+    """
+    db = conffwk.Configuration("oksconflibs:" + source)
+    source = os.path.realpath(source)
+
+    #print("Creating new database")
+    new_db = conffwk.Configuration("oksconflibs")
+    new_db.create_db(str(output_file), includes)
+    new_db.commit()
+
+    #print("Reading dal objects from old db")
+    dals = db.get_all_dals()
+
+    #print(f"Copying objects to new db")
+    for dal in dals:
+        if os.path.realpath(db.get_obj(dals[dal].className(), dals[dal].id).contained_in()) != source:
+            continue
+
+        # print(f"Loading object {dal} into cache")
+        db.get_dal(dals[dal].className(), dals[dal].id)
+
+        # print(f"Copying object: {dal}")
+        new_db.add_dal(dals[dal])
+
+    #print("Saving database")
+    new_db.commit()
+
+
+def copy_configuration(dest_dir : Path, input_files: list, jobs: int = None):
+    """Copy the databases in input_files, and all the data files they include,
+    to dest_dir. Each file is copied once, however many files include it.
+
+    Files are copied in a pool of jobs processes (default: one per CPU). The
+    include hierarchy is processed level by level, so that a file is only
+    written once all the files it includes have been copied. Small or purely
+    linear hierarchies are copied serially.
+    """
     if len(input_files) == 0:
         return []
 
     print(f"Copying configuration represented by databases: {input_files} to {dest_dir}")
     dest_dir = dest_dir.resolve() # Always include by absolute path when copying
     sys.setrecursionlimit(10000)  # for example
+    start = time.perf_counter()
 
-    output_dbs = []
-
+    # resolved source -> (schema includes, resolved data includes)
+    sources = {}
     for input_file in input_files:
         db = conffwk.Configuration("oksconflibs:" + input_file)
-        includes = db.get_includes(None)
-        schemas = [i for i in includes if "schema.xml" in i]
-        dbs = [i for i in includes if "data.xml" in i]
-        newdbs = copy_configuration(dest_dir, dbs)
-
-        #print("Creating new database")
-        output_file = dest_dir / os.path.basename(input_file)
+        graph = IncludeGraph(db)
+
+        resolved = graph.resolve_paths(input_file)
+
+        for file in [None] + graph.files:
+            if file is not None and "data.xml" not in file:
+                continue
+            source = resolved[file]
+            if source in sources:
+                continue
+            includes = graph.includes(file)
+            sources[source] = ([i for i in includes if "schema.xml" in i],
+                               [resolved[i] for i in includes if "data.xml" in i])
+
+    outputs = {}
+    for source in sources:
+        output_file = str(dest_dir / os.path.basename(source))
+        if output_file in outputs.values():
+            raise RuntimeError(f"Cannot copy {source}: another database is already copied to {output_file}")
+        outputs[source] = output_file
+
+    # Level of a file = 1 + highest level of the files it includes
+    order = topological_order({source: data_includes for source, (_, data_includes) in sources.items()})
+    for cycle in order.cycles:
+        print(f"WARNING: include cycle between {cycle}")
+    levels = {}
+    for source in reversed(order.order):
+        if source in sources:
+            levels[source] = 1 + max((levels[i] for i in sources[source][1] if i in levels), default=-1)
+    files_per_level = [[] for _ in range(max(levels.values()) + 1)]
+    for source, level in levels.items():
+        files_per_level[level].append(source)
+
+    def copy_args(source):
+        schemas, data_includes = sources[source]
+        return source, outputs[source], schemas + [outputs[i] for i in data_includes if i in levels and levels[i] < levels[source]]
+
+    if jobs == 1 or len(sources) < _POOL_MIN_FILES or all(len(f) == 1 for f in files_per_level):
+        for level_files in files_per_level:
+            for source in level_files:
+                _copy_file(*copy_args(source))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            for level_files in files_per_level:
+                futures = [pool.submit(_copy_file, *copy_args(source)) for source in level_files]
+                for future in futures:
+                    future.result()
+
+    print(f"Copied {len(sources)} databases in {time.perf_counter() - start:.1f} s")
+    print("DONE")
+        
+    return [outputs[os.path.realpath(input_file)] for input_file in input_files]
 
-        new_db = conffwk.Configuration("oksconflibs")
-        new_db.create_db(str(output_file), schemas + newdbs)
-        new_db.commit()
 
-        #print("Reading dal objects from old db")
-        dals = db.get_all_dals()
+def merge_dals(new_db, dals, existing: set, cache: dict = None) -> int:
+    """Copy into new_db the dal objects it does not contain yet
 
-        #print(f"Copying objects to new db")
-        for dal in dals:
+    Arguments:
+        new_db -- destination configuration
+        dals -- iterable of dal objects to merge
+        existing -- set of (class name, uid) of the objects already in new_db,
+                    updated with the objects copied
+        cache -- add_dal cache shared between calls, so that objects reached
+                 through several relationships are only copied once
 
-            # print(f"Loading object {dal} into cache")
-            db.get_dal(dals[dal].className(), dals[dal].id)
+    Returns:
+        number of objects copied
+    """
+    if cache is None:
+        cache = {}
 
-            # print(f"Copying object: {dal}")
-            new_db.add_dal(dals[dal])
+    copied = 0
+    for dal in dals:
+        key = (dal.className(), dal.id)
+        if key in existing:
+            continue
+        new_db.add_dal(dal, cache=cache)
+        existing.add(key)
+        copied += 1
 
-        #print("Saving database")
-        new_db.commit()
-        output_dbs.append(str(output_file))
-    print("DONE")
-        
-    return output_dbs
+    return copied
 
 
 def consolidate_files(oksfile, *input_files):
@@ -98,9 +332,9 @@ def consolidate_files(oksfile, *input_files):
 
     for input_file in input_files:
         dbs.append(conffwk.Configuration("oksconflibs:" + input_file))
-        includes += get_all_includes(dbs[len(dbs) - 1], None)
+        includes += IncludeGraph(dbs[-1]).all_includes()
         
-    includes = list(set(includes))
+    includes = list(dict.fromkeys(includes))
     includes = [i for i in includes if i not in input_files]    
     print(f"Included files: {includes}")
 
@@ -109,20 +343,22 @@ def consolidate_files(oksfile, *input_files):
 
     new_db.commit()
 
+    # Objects provided by the included files, and then by the databases already merged
+    existing = {(dal.className(), dal.id) for dal in new_db.get_all_dals().values()}
+    cache = {}
+    copied = 0
+    start = time.perf_counter()
+
     for db in dbs:
         print(f"Reading dal objects from old db {db}")
         dals = db.get_all_dals()
 
         print(f"Copying objects to new db {new_db}")
-        for dal in dals:
-
-            try: 
-                new_db.get_dal(dals[dal].className(), dals[dal].id)
-                #print(f"ERROR: Database already contains object {dal}")  
-            except:            
-                # print(f"Copying object: {dal}")
-                new_db.add_dal(dals[dal])
-            new_db.commit()
+        copied += merge_dals(new_db, dals.values(), existing, cache)
 
     print(f"Saving database {new_db}")
-    new_db.commit()
\ No newline at end of file
+    new_db.commit()
+
+    elapsed = time.perf_counter() - start
+    print(f"Copied {copied} objects in {elapsed:.1f} s ({copied / max(elapsed, 1e-9):.0f} objects/s)")
+    return copied
@@ -1,6 +1,6 @@
 import conffwk
 import os
-import glob
+from daqconf.utils import find_oksincludes
 
 
 def generate_file(oksfile, include):
@@ -10,32 +10,12 @@ def generate_file(oksfile, include):
 
     includefiles = ["schema/confmodel/dunedaq.schema.xml"]
 
-    searchdirs = [path for path in os.environ["DUNEDAQ_DB_PATH"].split(":")]
-    searchdirs.append(os.path.dirname(oksfile))
-    for inc in include:
-        # print (f"Searching for {inc}")
-        match = False
-        inc = inc.removesuffix(".xml")
-        if inc.endswith(".data"):
-            ftype = "data"
-        elif inc.endswith(".schema"):
-            ftype = "schema"
-        else:
-            ftype = "*"
-            inc = inc + "*"
-        for path in searchdirs:
-            matches = glob.glob(f"{inc}.xml", root_dir=path)
-            if len(matches) == 0:
-                matches = glob.glob(f"{ftype}/{inc}.xml", root_dir=path)
-            for filename in matches:
-                print(f"Adding {filename} to include list")
-                includefiles.append(filename)
-                match = True
-            if match:
-                break
-        if not match:
-            print(f"Error could not find include file for {inc}")
-            return
+    res, extra_includes = find_oksincludes(include, os.path.dirname(oksfile), data_dirs=["data"], all_matches=True)
+    if res:
+        includefiles += [inc for inc in extra_includes if inc not in includefiles]
+    else:
+        return
+
     db = conffwk.Configuration("oksconflibs")
     if not oksfile.endswith(".data.xml"):
         oksfile = oksfile + ".data.xml"
@@ -44,44 +44,189 @@ def compare_dal_obj(a, b):
 
 
 #---------------
-def find_related(dal_obj, dal_group: set):
-
-
-    rels = get_relation_list(dal_obj)
-
-    rel_objs = set()
-    for rel in rels:
+def _related_objects(dal_obj) -> list:
+    """Objects directly referenced by the relationships of dal_obj"""
+    related = []
+    for rel in get_relation_list(dal_obj):
         rel_val = getattr(dal_obj, rel)
 
         if rel_val is None:
             continue
 
-        rel_objs.update(rel_val if isinstance(rel_val,list) else [rel_val])
+        related += [o for o in (rel_val if isinstance(rel_val, list) else [rel_val]) if o is not None]
+    return related
 
-    # Isolate relationship objects that are not in the dal_group yet
-    new_rel_objs = rel_objs - dal_group
 
-    # Safely add the new object to the group
-    dal_group.update(rel_objs)
-    for o in new_rel_objs:
-        if o is None:
-            continue
+class ReachabilityIndex:
+    """
+    Memoised transitive closures of the relationship graph of dal objects.
+
+    The graph is condensed into its strongly connected components with an
+    iterative version of Tarjan's algorithm, so objects on a relationship
+    cycle share their closure and deep graphs do not hit the Python recursion
+    limit. Objects get an index as they are reached, and only the components
+    and the edges between them are kept for every object: closures are int
+    bitsets over the indices, computed on demand and memoised for the queried
+    components only, so memory stays linear in the size of the graph.
+    """
+
+    def __init__(self):
+        # (class name, uid) -> index
+        self._index = {}
+        # index -> dal object
+        self._dals = []
+        # index -> component
+        self._component = []
+        # component -> indices of its members
+        self._members = []
+        # component -> components its members relate to, itself included on a cycle
+        self._successors = []
+        # component -> bitset of the objects reachable from it, for the queried components
+        self._closures = {}
+
+    @staticmethod
+    def _key(dal_obj):
+        return (dal_obj.className(), dal_obj.id)
+
+    def _condense(self, dal_obj) -> None:
+        """Index the objects reachable from dal_obj that are not indexed yet"""
+        root = self._key(dal_obj)
+        order = {root: 0}
+        lowlink = {root: 0}
+        stack = [root]
+        on_stack = {root}
+        dals = {root: dal_obj}
+        successors = {}
+
+        def children(key):
+            related = _related_objects(dals[key])
+            successors[key] = [self._key(o) for o in related]
+            for o, k in zip(related, successors[key]):
+                dals.setdefault(k, o)
+            return iter(successors[key])
+
+        work = [(root, children(root))]
+        while work:
+            node, it = work[-1]
+            for child in it:
+                if child in self._index:
+                    continue
+                if child not in order:
+                    order[child] = lowlink[child] = len(order)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, children(child)))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], order[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] != order[node]:
+                    continue
+
+                # node is the root of a strongly connected component: number its members
+                component = len(self._members)
+                members = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    members.append(member)
+                    self._index[member] = len(self._dals)
+                    self._dals.append(dals[member])
+                    self._component.append(component)
+                    if member == node:
+                        break
+                self._members.append([self._index[m] for m in members])
+                self._successors.append({self._component[self._index[succ]] for m in members for succ in successors[m]})
+
+    def closure(self, dal_obj) -> int:
+        """Bitset of the objects reachable from dal_obj"""
+        root = self._key(dal_obj)
+        if root not in self._index:
+            self._condense(dal_obj)
+        component = self._component[self._index[root]]
+        closure = self._closures.get(component)
+        if closure is not None:
+            return closure
+
+        bits = bytearray((len(self._dals) + 7) // 8)
+        closure = 0
+        visited = set()
+        work = list(self._successors[component])
+        while work:
+            c = work.pop()
+            if c in visited:
+                continue
+            visited.add(c)
+            for i in self._members[c]:
+                bits[i >> 3] |= 1 << (i & 7)
+            if c in self._closures:
+                closure |= self._closures[c]
+            else:
+                work += self._successors[c]
+        closure |= int.from_bytes(bits, "little")
+        self._closures[component] = closure
+        return closure
+
+    def related(self, dal_obj) -> list:
+        """Objects reachable from dal_obj through its relationships"""
+        bits = bin(self.closure(dal_obj))[:1:-1]
+        return [self._dals[i] for i, bit in enumerate(bits) if bit == '1']
+
+    def count_related(self, dal_obj) -> int:
+        """Number of objects reachable from dal_obj"""
+        return bin(self.closure(dal_obj)).count('1')
+
+
+def find_related(dal_obj, dal_group: set, index: ReachabilityIndex = None):
+    """
+    Add to dal_group all the objects reachable from dal_obj through relationships.
+    Passing the same index to several calls shares the closures computed.
+    """
+    if index is None:
+        index = ReachabilityIndex()
+
+    dal_group.update(index.related(dal_obj))
 
-        find_related(o, dal_group)
-        
 from collections.abc import Iterable
-def find_duplicates( collection: Iterable ):
+
+def _freeze(value):
+    """Hashable representation of an attribute or relationship value"""
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+
+    # Related objects are represented by their identity
+    if hasattr(value, 'className'):
+        return (value.className(), value.id)
+
+    return value
+
+def dal_content_key(o):
+    """
+    Hashable key representing the content of a dal object: its class,
+    attribute values and the ids of the objects it relates to.
+    Two objects have the same key when compare_dal_obj considers them equal.
+    """
+    return (
+        o.className(),
+        tuple((a, _freeze(getattr(o, a))) for a in get_attribute_list(o)),
+        tuple((r, _freeze(getattr(o, r))) for r in get_relation_list(o)),
+    )
+
+def find_duplicates( collection: Iterable ) -> list[list]:
     """
     Find duplicated dal objects in a collection by based on objects attributes and relationships
+
+    Objects are grouped by content key in a single pass. Returns the list of
+    groups of identical objects (groups with more than one member), in order
+    of first appearance in the collection.
     """
-    
-    n_items = len(collection)
-    duplicates = set()
-    for i in range(n_items):
-        for j in range(i+1, n_items):
-            if compare_dal_obj(collection[i], collection[j]):
-                duplicates.add(collection[i])
-                duplicates.add(collection[j])
 
-    return duplicates
+    groups = {}
+    for o in collection:
+        groups.setdefault(dal_content_key(o), []).append(o)
 
+    return [g for g in groups.values() if len(g) > 1]
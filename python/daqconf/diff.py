@@ -0,0 +1,190 @@
+"""
+Content-hash based comparison of two configurations.
+
+Every object gets two hashes:
+  - a local hash of its class, attribute values and the identifiers of the
+    objects it relates to, which changes when the object itself is modified;
+  - a tree (Merkle) hash combining its local hash with the identifiers and
+    tree hashes of the objects it relates to, which changes when anything
+    reachable from it is modified. Objects on a relationship cycle share the
+    hash of the cycle.
+
+Two objects with the same identifier and tree hash have identical subtrees,
+so the comparison of the objects reachable from a Session skips them without
+looking further.
+"""
+import hashlib
+import time
+from dataclasses import dataclass, field
+
+from daqconf.dal_helpers import dal_content_key, get_attribute_list, get_relation_list
+from daqconf.graph_utils import strongly_connected_components
+
+
+def _digest(value) -> bytes:
+    return hashlib.blake2b(repr(value).encode(), digest_size=16).digest()
+
+
+def _references(value) -> list:
+    """(class name, uid) of the objects in a relationship value"""
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    return [(v.className(), v.id) for v in value if v is not None]
+
+
+class ContentIndex:
+    """Local and tree content hashes of all the objects of a configuration"""
+
+    def __init__(self, db):
+        self._db = db
+        # (class name, uid) -> local hash
+        self.local = {}
+        # (class name, uid) -> related objects
+        self.successors = {}
+
+        for dal in db.get_all_dals().values():
+            key = (dal.className(), dal.id)
+            if key in self.local:
+                continue
+            self.local[key] = _digest(dal_content_key(dal))
+            self.successors[key] = [r for rel in get_relation_list(dal) for r in _references(getattr(dal, rel))]
+
+        # (class name, uid) -> tree hash
+        self.tree = {}
+        # Components come sinks first, so related objects are always hashed before.
+        # Related objects enter the tree hash with their identifier, in relationship
+        # order, so that objects swapping contents change the hash of their parents.
+        for component in strongly_connected_components(self.successors, self.local):
+            members = set(component)
+            if len(component) == 1 and component[0] not in self.successors[component[0]]:
+                key = component[0]
+                self.tree[key] = _digest((self.local[key], [(s, self.tree.get(s)) for s in self.successors[key]]))
+                continue
+            cycle_hash = _digest([(m, self.local[m], [(s, self.tree.get(s)) for s in self.successors[m] if s not in members])
+                                  for m in sorted(component)])
+            for m in component:
+                self.tree[m] = _digest((self.local[m], cycle_hash))
+
+    @property
+    def db(self):
+        return self._db
+
+    def __len__(self):
+        return len(self.local)
+
+
+@dataclass
+class DiffResult:
+    """Objects, as (class name, uid), that differ between two configurations"""
+    added: list = field(default_factory=list)
+    removed: list = field(default_factory=list)
+    # (class name, uid) -> names of the attributes and relationships that changed
+    modified: dict = field(default_factory=dict)
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.modified)
+
+
+def _changed_members(dal_a, dal_b) -> list:
+    changed = [a for a in get_attribute_list(dal_a) if getattr(dal_a, a) != getattr(dal_b, a)]
+    changed += [r for r in get_relation_list(dal_a)
+                if _references(getattr(dal_a, r)) != _references(getattr(dal_b, r))]
+    return changed
+
+
+def diff_indexes(old: ContentIndex, new: ContentIndex, roots: list = None, new_roots: list = None) -> DiffResult:
+    """Compare two indexed configurations
+
+    Arguments:
+        old, new -- ContentIndex of the configurations
+        roots -- (class name, uid) of the objects to start from, e.g. a Session.
+                 Only the objects reachable from them are compared, skipping the
+                 subtrees with the same tree hash. All the objects are compared
+                 if roots is None.
+        new_roots -- roots in the new configuration, if different from roots
+    """
+    if roots is None:
+        keys = old.local.keys() & new.local.keys()
+        added = new.local.keys() - old.local.keys()
+        removed = old.local.keys() - new.local.keys()
+        modified = [k for k in keys if old.local[k] != new.local[k]]
+    else:
+        added, removed, modified = set(), set(), []
+        visited = set()
+        stack = list(roots) + list(new_roots or [])
+        while stack:
+            key = stack.pop()
+            if key in visited:
+                continue
+            visited.add(key)
+
+            in_old, in_new = key in old.local, key in new.local
+            if in_old and in_new:
+                if old.tree[key] == new.tree[key]:
+                    # Identical subtree
+                    continue
+                if old.local[key] != new.local[key]:
+                    modified.append(key)
+            elif in_new:
+                added.add(key)
+            elif in_old:
+                removed.add(key)
+
+            stack += old.successors.get(key, [])
+            stack += new.successors.get(key, [])
+
+    result = DiffResult(sorted(added), sorted(removed))
+    for key in sorted(modified):
+        result.modified[key] = _changed_members(old.db.get_dal(*key), new.db.get_dal(*key))
+    return result
+
+
+def diff_configurations(old_db, new_db, session=None, new_session=None) -> DiffResult:
+    """Compare two configurations, or the parts of them reachable from a Session
+
+    Arguments:
+        old_db, new_db -- configurations (conffwk.Configuration or Snapshot)
+        session -- name of the Session to compare, None to compare all objects
+        new_session -- name of the Session in new_db, if different
+
+    Raises:
+        RuntimeError if a Session is not found in its configuration
+    """
+    old, new = ContentIndex(old_db), ContentIndex(new_db)
+    if session is None:
+        return diff_indexes(old, new)
+    old_root, new_root = ("Session", session), ("Session", new_session or session)
+    for index, root, which in ((old, old_root, "old"), (new, new_root, "new")):
+        if root not in index.local:
+            raise RuntimeError(f"Could not find Session {root[1]} in the {which} configuration")
+    return diff_indexes(old, new, [old_root], [new_root])
+
+
+def print_diff(result: DiffResult) -> None:
+    print(f"Added ({len(result.added)}):")
+    for class_name, uid in result.added:
+        print(f"  + {uid}@{class_name}")
+    print(f"Removed ({len(result.removed)}):")
+    for class_name, uid in result.removed:
+        print(f"  - {uid}@{class_name}")
+    print(f"Modified ({len(result.modified)}):")
+    for (class_name, uid), members in result.modified.items():
+        print(f"  ~ {uid}@{class_name}: {', '.join(members)}")
+
+
+def diff_files(old_file: str, new_file: str, session=None, new_session=None, use_snapshot=True) -> DiffResult:
+    """Compare two configuration files and print the differences"""
+    from daqconf.snapshot import load_configuration
+
+    old_db = load_configuration(old_file, use_snapshot)
+    new_db = load_configuration(new_file, use_snapshot)
+
+    start = time.perf_counter()
+    result = diff_configurations(old_db, new_db, session, new_session)
+    elapsed = time.perf_counter() - start
+
+    print_diff(result)
+    print(f"Compared {old_file} and {new_file} in {elapsed:.3f} s")
+    return result
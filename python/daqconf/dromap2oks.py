@@ -1,10 +1,17 @@
 import conffwk
 import os
 import json
+import re
 import sys
+import time
+from dataclasses import dataclass, field
 
-def dro_json_to_oks(jsonfile, oksfile, source_id_offset, nomap, lcores):
-    """Simple script to convert a JSON readout map file to an OKS file."""
+def dro_json_to_oks(jsonfile, oksfile, source_id_offset, nomap, lcores, stream=False, batch_size=10000):
+    """Simple script to convert a JSON readout map file to an OKS file.
+
+    With stream=True the map is converted by dro_json_to_oks_streaming."""
+    if stream:
+        return dro_json_to_oks_streaming(jsonfile, oksfile, source_id_offset, lcores, batch_size)
 
     group_name = os.path.basename(jsonfile).removesuffix(".json")
     if oksfile == "":
@@ -261,3 +268,341 @@ def dro_json_to_oks(jsonfile, oksfile, source_id_offset, nomap, lcores):
         db.update_dal(daqcon_dal)
 
     db.commit()
+
+
+#---------------
+# Streaming conversion
+#
+_WHITESPACE = re.compile(r"\s*")
+_ELEMENT_END = frozenset(" \t\n\r,]")
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20):
+    """Yield the elements of the JSON array read from the text stream f one at
+    a time, so that only the element being decoded and the current chunk of
+    the file are held in memory"""
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+        return not eof
+
+    def next_char() -> str:
+        """Skip whitespace, return the next character or '' at the end of the file"""
+        nonlocal pos
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                return ""
+
+    if next_char() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if next_char() == "]":
+        return
+
+    while True:
+        next_char()
+        while True:
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+                # Only trust the end of the element if it is followed by a separator:
+                # a number cut by the end of the chunk (e.g. '1.' of '1.5') decodes
+                # without error but may continue in the next chunk
+                if eof or (end < len(buf) and buf[end] in _ELEMENT_END):
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            more()
+        pos = end
+        yield element
+
+        c = next_char()
+        if c == "]":
+            return
+        if c != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {c!r}")
+        pos += 1
+
+
+@dataclass
+class ReadoutLink:
+    """One entry of the readout map"""
+    source_id: int
+    geo_id: dict
+    parameters: dict
+
+
+@dataclass
+class EthSender:
+    """Consecutive eth entries sharing a tx NIC, i.e. one HermesDataSender"""
+    link_id: int
+    nic_name: str
+    parameters: dict
+    links: list = field(default_factory=list)
+
+    @property
+    def hermes_id(self) -> str:
+        geo_id = self.links[-1].geo_id
+        return f"hermes_{geo_id['det_id']}_{geo_id['crate_id']}_{geo_id['slot_id']}-{self.link_id}"
+
+
+@dataclass
+class EthReceiver:
+    """Consecutive eth entries sharing an rx NIC, i.e. one DetectorToDaqConnection"""
+    parameters: dict
+    senders: list = field(default_factory=list)
+
+
+@dataclass
+class FelixGroup:
+    """Consecutive flx entries sharing a FELIX card and SLR, i.e. one DetectorToDaqConnection"""
+    card: int
+    slr: int
+    links: list = field(default_factory=list)
+
+
+def group_readout_map(entries, source_id_offset: int = 0):
+    """Group readout map entries by rx/tx NIC (eth) and by FELIX card/SLR (flx)
+
+    Consecutive entries with the same NIC, or card and SLR, form a group, as in
+    dro_json_to_oks. Groups are yielded as soon as they are complete, so that
+    only the eth and flx groups being filled are held in memory. Only the keys
+    of the groups already yielded are kept, to detect maps where the entries
+    of an rx NIC or of a card and SLR are not consecutive.
+
+    Yields:
+        EthReceiver and FelixGroup objects
+
+    Raises:
+        RuntimeError if the entries of an rx NIC or a FELIX card/SLR are not consecutive,
+        since their objects would be written twice under the same uids
+    """
+    receiver = None
+    sender = None
+    felix = None
+    link_number = 0
+    nic_num = -1
+    # rx MACs and (card, slr) of the groups already yielded
+    done_rx = set()
+    done_felix = set()
+    # tx MAC -> name of its NetworkInterface
+    tx_nic_names = {}
+
+    for entry in entries:
+        pars = entry["parameters"]
+        link = ReadoutLink(entry["src_id"] + source_id_offset, entry["geo_id"], pars)
+
+        if entry["kind"] == "eth":
+            if receiver is not None and pars["rx_mac"] != receiver.parameters["rx_mac"]:
+                done_rx.add(receiver.parameters["rx_mac"])
+                yield receiver
+                receiver = None
+            if receiver is None:
+                if pars["rx_mac"] in done_rx:
+                    raise RuntimeError(f"Entries of rx NIC {pars['rx_mac']} are not consecutive (src_id {entry['src_id']})")
+                receiver = EthReceiver(pars)
+
+            # A new rx NIC always starts a new sender
+            if sender is None or pars["tx_mac"] != sender.parameters["tx_mac"] or not receiver.senders:
+                if sender is not None:
+                    link_number += 1
+                nic_name = tx_nic_names.get(pars["tx_mac"])
+                if nic_name is None:
+                    if sender is not None and pars["tx_host"] != sender.parameters["tx_host"]:
+                        nic_num = -1
+                    nic_num += 1
+                    nic_name = f"nw-{pars['tx_host']}-{nic_num}"
+                    tx_nic_names[pars["tx_mac"]] = nic_name
+                sender = EthSender(link_number, nic_name, pars)
+                receiver.senders.append(sender)
+            sender.links.append(link)
+
+        elif entry["kind"] == "flx":
+            if felix is not None and (pars["card"], pars["slr"]) != (felix.card, felix.slr):
+                done_felix.add((felix.card, felix.slr))
+                yield felix
+                felix = None
+            if felix is None:
+                if (pars["card"], pars["slr"]) in done_felix:
+                    raise RuntimeError(f"Entries of FELIX card {pars['card']} slr {pars['slr']} are not consecutive (src_id {entry['src_id']})")
+                felix = FelixGroup(pars["card"], pars["slr"])
+            felix.links.append(link)
+
+        else:
+            raise RuntimeError(f'Unknown kind of readout {entry["kind"]}!')
+
+    if receiver is not None:
+        yield receiver
+    if felix is not None:
+        yield felix
+
+
+class _BatchWriter:
+    """Writes dal objects to the database in batches: the top objects of a
+    batch are updated with a shared cache, so that the objects they reference
+    are written once"""
+
+    def __init__(self, db, batch_size: int):
+        self._db = db
+        self._batch_size = batch_size
+        self._pending = []
+        self._pending_links = 0
+        self.n_batches = 0
+
+    def add(self, dals: list, n_links: int) -> None:
+        self._pending += dals
+        self._pending_links += n_links
+        if self._pending_links >= self._batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        cache = {}
+        for dal_obj in self._pending:
+            self._db.update_dal(dal_obj, cache=cache)
+        self._pending = []
+        self._pending_links = 0
+        self.n_batches += 1
+
+
+def _stream_dals(dal, link: ReadoutLink):
+    geo_id = link.geo_id
+    geo_dal = dal.GeoId(f"geoId-{link.source_id}",
+                        detector_id=geo_id["det_id"],
+                        crate_id=geo_id["crate_id"],
+                        slot_id=geo_id["slot_id"],
+                        stream_id=geo_id["stream_id"]
+                        )
+    return dal.DetectorStream(f"stream-{link.source_id}",
+                              source_id=link.source_id,
+                              geo_id=geo_dal
+                              )
+
+
+def dro_json_to_oks_streaming(jsonfile, oksfile, source_id_offset, lcores, batch_size=10000):
+    """Convert a JSON readout map file to an OKS file in bounded memory.
+
+    Entries are decoded one at a time with iter_json_array and grouped with
+    group_readout_map; the objects of each group are created when the group is
+    complete and written to the database in batches of about batch_size links,
+    with a single commit at the end.
+
+    Each DetectorToDaqConnection contains the ResourceSetAND of its senders
+    (HermesDataSenders or FelixDataSenders) and its receiver (DPDKReceiver or
+    FelixInterface); the ResourceSetAND of the streams of each connection is
+    also created, as in dro_json_to_oks.
+    """
+    start = time.perf_counter()
+    group_name = os.path.basename(jsonfile).removesuffix(".json")
+    if oksfile == "":
+        oksfile = group_name + ".data.xml"
+
+    print(
+        f"Streaming RO map from {jsonfile} to OKS in {oksfile} offsetting source_ids by {source_id_offset}"
+    )
+
+    schemafiles = [
+        "schema/confmodel/dunedaq.schema.xml",
+        "schema/appmodel/application.schema.xml",
+        "schema/appmodel/fdmodules.schema.xml",
+        "schema/appmodel/wiec.schema.xml"
+    ]
+    dal = conffwk.dal.module("dal", schemafiles[-1])
+    db = conffwk.Configuration("oksconflibs")
+    db.create_db(oksfile, schemafiles)
+
+    writer = _BatchWriter(db, batch_size)
+    nic_config_dal = None
+    n_links = 0
+    n_connections = 0
+
+    with open(jsonfile) as f:
+        for group in group_readout_map(iter_json_array(f), source_id_offset):
+            if isinstance(group, EthReceiver):
+                pars = group.parameters
+                if nic_config_dal is None:
+                    lcore_dal = dal.ProcessingResource(
+                        f"lcores-{group_name}",
+                        cpu_cores = lcores.split(',')
+                    )
+                    nic_config_dal = dal.DPDKPortConfiguration(
+                        f"nicConfig-{group_name}",
+                        used_lcores = [ lcore_dal ]
+                    )
+
+                print(f"Adding nic {pars['rx_mac']} with id nic-{pars['rx_host']} and {len(group.senders)} senders")
+                rxnic_dal = dal.NetworkDevice(
+                    f"nic-{pars['rx_host']}",
+                    mac_address = pars["rx_mac"],
+                    ip_address = pars["rx_ip"]
+                )
+                receiver_dal = dal.DPDKReceiver(
+                    f"{pars['rx_host']}-receiver",
+                    uses = rxnic_dal,
+                    configuration = nic_config_dal
+                )
+
+                senders = []
+                streams = []
+                for sender in group.senders:
+                    txnic_dal = dal.NetworkInterface(
+                        sender.nic_name,
+                        mac_address = sender.parameters["tx_mac"],
+                        ip_address = sender.parameters["tx_ip"]
+                    )
+                    sender_streams = [_stream_dals(dal, link) for link in sender.links]
+                    senders.append(dal.HermesDataSender(
+                        sender.hermes_id,
+                        link_id = sender.link_id,
+                        contains = sender_streams,
+                        uses = txnic_dal
+                    ))
+                    streams += sender_streams
+                name = pars['rx_host']
+
+            else:
+                print(f"Adding FelixInterface felix-{group.links[-1].source_id} card={group.card} slr={group.slr}")
+                receiver_dal = dal.FelixInterface(
+                    f"felix-{group.links[-1].source_id}",
+                    card=group.card,
+                    slr=group.slr
+                )
+                senders = []
+                streams = []
+                for link in group.links:
+                    stream_dal = _stream_dals(dal, link)
+                    senders.append(dal.FelixDataSender(
+                        f"flxsender-{link.source_id}",
+                        protocol=link.parameters["protocol"],
+                        link=link.parameters["link"],
+                        contains = [stream_dal]
+                    ))
+                    streams.append(stream_dal)
+                name = f"felix-{group.links[-1].source_id}"
+
+            senders_dal = dal.ResourceSetAND(f"{name}-senders", contains = senders)
+            streams_dal = dal.ResourceSetAND(f"{name}-streams", contains = streams)
+            daqcon_dal = dal.DetectorToDaqConnection(
+                f"{name}-connections",
+                contains = [senders_dal, receiver_dal]
+            )
+            writer.add([daqcon_dal, streams_dal], len(streams))
+            n_links += len(streams)
+            n_connections += 1
+
+    writer.flush()
+    db.commit()
+    print(f"Converted {n_links} links into {n_connections} connections in {writer.n_batches} batches "
+          f"in {time.perf_counter() - start:.1f} s")
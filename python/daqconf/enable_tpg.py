@@ -1,24 +1,52 @@
 import conffwk
-import confmodel
-import appmodel
 
-import os
-import glob
+import time
 
-def get_segment_apps(segment):
-    apps = []
+from daqconf.session import SessionIndex
 
-    for ss in segment.segments:
-        apps += get_segment_apps(ss)
 
-    for aa in segment.applications:
-        apps.append(aa.id)
+def get_readout_apps(session, segments=None, hosts=None, index: SessionIndex = None) -> list:
+    """ReadoutApplications of a session
 
-    return apps
+    Arguments:
+        session -- Session dal object
+        segments -- only select applications of these segments (nested segments included)
+        hosts -- only select applications running on these hosts (VirtualHost or PhysicalHost ids)
+        index -- SessionIndex of the session, built if not given
+    """
+    if index is None:
+        index = SessionIndex(session)
 
-def enable_tpg(oksfile, disable, session_name):
+    apps = index.apps_of_class("ReadoutApplication")
+
+    if segments:
+        in_segments = set()
+        for segment in segments:
+            if segment not in index.segments:
+                print(f"Error could not find Segment {segment} in Session {session.id}")
+                continue
+            in_segments.update(a.id for a in index.apps_in_segment(segment))
+        apps = [a for a in apps if a.id in in_segments]
+
+    if hosts:
+        on_hosts = {a.id for host in hosts for a in index.apps_on_host(host)}
+        apps = [a for a in apps if a.id in on_hosts]
+
+    return list({a.id: a for a in apps}.values())
+
+
+def enable_tpg(oksfile, disable, session_name, tp=True, ta=True, segments=None, hosts=None):
     """Script to enable or disable (-d) TP generation in ReadoutApplications of the
-    specified OKS configuration"""
+    specified OKS configuration
+
+    Arguments:
+        tp, ta -- whether to change TP generation and TA generation
+        segments, hosts -- restrict the change to the applications of these
+                           segments or running on these hosts, see get_readout_apps
+
+    The applications whose settings change are updated and committed at once.
+    """
+    start = time.perf_counter()
     db = conffwk.Configuration("oksconflibs:" + oksfile)
     if session_name == "":
         session_dals = db.get_dals(class_name="Session")
@@ -32,22 +60,36 @@ def enable_tpg(oksfile, disable, session_name):
         except:
             print(f"Error could not find Session {session_name} in file {oksfile}")
             return
-    # disabled = session.disabled
-    segment = session.segment
-    apps = get_segment_apps(segment)
-    for aa in apps:
-        try:
-            roapp = db.get_dal(class_name="ReadoutApplication", uid=aa)
-            if disable:
-                roapp.tp_generation_enabled = 0
-                roapp.ta_generation_enabled = 0
-                print(f"Disable TP generation in {roapp.id}.")
-            else:
-                roapp.tp_generation_enabled = 1
-                roapp.ta_generation_enabled = 1
-                print(f"Enable TP generation in {roapp.id}.")
+
+    value = 0 if disable else 1
+    action = "Disable" if disable else "Enable"
+    what = " and ".join(n for n, sel in (("TP", tp), ("TA", ta)) if sel)
+    if not what:
+        print("Nothing to do: neither TP nor TA generation selected")
+        return
+
+    roapps = get_readout_apps(session, segments, hosts)
+    if not roapps:
+        print(f"No ReadoutApplication selected in Session {session.id}")
+        return
+
+    updated = 0
+    for roapp in roapps:
+        changed = False
+        if tp and roapp.tp_generation_enabled != value:
+            roapp.tp_generation_enabled = value
+            changed = True
+        if ta and roapp.ta_generation_enabled != value:
+            roapp.ta_generation_enabled = value
+            changed = True
+
+        if changed:
+            print(f"{action} {what} generation in {roapp.id}.")
             db.update_dal(roapp)
-        except:
-            continue
-            
-    db.commit()
+            updated += 1
+        else:
+            print(f"{what} generation already {action.lower()}d in {roapp.id}.")
+
+    if updated:
+        db.commit()
+    print(f"Updated {updated} of {len(roapps)} ReadoutApplications in {time.perf_counter() - start:.3f} s")
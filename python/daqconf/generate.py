@@ -1,11 +1,37 @@
 from dataclasses import dataclass
 from daqconf.assets import resolve_asset_file
 from daqconf.utils import find_oksincludes
+from daqconf.cached_configuration import CachedConfiguration
 import conffwk
-import glob
 import os
 
 
+def _create_db(db, oksfile, includefiles):
+    """Create a new OKS database file and make it the active one"""
+    if not oksfile.endswith(".data.xml"):
+        oksfile = oksfile + ".data.xml"
+    print(f"Creating OKS database file {oksfile}")
+    db.create_db(oksfile, includefiles)
+    db.set_active(oksfile)
+    return oksfile
+
+
+def _get_localhost(db, dal):
+    """Return the vlocalhost VirtualHost, creating it in the active database
+    if the included files do not provide it"""
+    for vhost in db.get_dals(class_name="VirtualHost"):
+        if vhost.id == "vlocalhost":
+            return vhost
+
+    cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
+    db.update_dal(cpus)
+    phdal = dal.PhysicalHost("localhost", contains=[cpus])
+    db.update_dal(phdal)
+    host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
+    db.update_dal(host)
+    return host
+
+
 def generate_dataflow(
     oksfile,
     include,
@@ -32,64 +58,63 @@ def generate_dataflow(
         return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    _create_db(db, oksfile, includefiles)
+    host = _get_localhost(db, dal)
+    _build_dataflow(db, dal, host, n_dfapps, tpwriting_enabled, generate_segment, n_data_writers)
+
+    db.commit()
+    return
 
-    hosts = []
-    for vhost in db.get_dals(class_name="VirtualHost"):
-        hosts.append(vhost.id)
-        if vhost.id == "vlocalhost":
-            host = vhost
-    if "vlocalhost" not in hosts:
-        cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
-        db.update_dal(cpus)
-        phdal = dal.PhysicalHost("localhost", contains=[cpus])
-        db.update_dal(phdal)
-        host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
-        db.update_dal(host)
-        hosts.append("vlocalhost")
+
+def _build_dataflow(db, dal, host, n_dfapps, tpwriting_enabled, generate_segment, n_data_writers=1):
+    required = {
+        "dfo_control": ("Service", "dfo-01_control"),
+        "tpw_control": ("Service", "tp-stream-writer_control"),
+        "tpw_source_id": ("SourceIDConf", "srcid-tp-stream-writer"),
+        "trigger_record_q_rule": ("QueueConnectionRule", "trigger-record-q-rule"),
+        "frag_net_rule": ("NetworkConnectionRule", "frag-net-rule"),
+        "df_token_net_rule": ("NetworkConnectionRule", "df-token-net-rule"),
+        "tpset_net_rule": ("NetworkConnectionRule", "tpset-net-rule"),
+        "ti_net_rule": ("NetworkConnectionRule", "ti-net-rule"),
+        "td_dfo_net_rule": ("NetworkConnectionRule", "td-dfo-net-rule"),
+        "td_trb_net_rule": ("NetworkConnectionRule", "td-trb-net-rule"),
+        "data_req_trig_net_rule": ("NetworkConnectionRule", "data-req-trig-net-rule"),
+        "data_req_hsi_net_rule": ("NetworkConnectionRule", "data-req-hsi-net-rule"),
+        "data_req_readout_net_rule": ("NetworkConnectionRule", "data-req-readout-net-rule"),
+        "opmon_conf": ("OpMonConf", "slow-all-monitoring"),
+        "dfo_conf": ("DFOConf", "dfoconf-01"),
+        "trb_conf": ("TRBConf", "trb-01"),
+        "dw_conf": ("DataWriterConf", "dw-01"),
+        "dfhw": ("DFHWConf", "dfhw-01"),
+    }
+    if tpwriting_enabled:
+        required["tpw_writer_conf"] = ("TPStreamWriterConf", "tp-stream-writer-conf")
+    if generate_segment:
+        required["fsm"] = ("FSMconfiguration", "FSMconfiguration_noAction")
+    templates = db.prefetch(required)
 
     # Services
-    dfo_control = db.get_dal(class_name="Service", uid="dfo-01_control")
-    tpw_control = db.get_dal(class_name="Service", uid="tp-stream-writer_control")
+    dfo_control = templates["dfo_control"]
+    tpw_control = templates["tpw_control"]
 
     # Source IDs
-    tpw_source_id = db.get_dal("SourceIDConf", uid="srcid-tp-stream-writer")
+    tpw_source_id = templates["tpw_source_id"]
 
     # Queue Rules
-    trigger_record_q_rule = db.get_dal(
-        class_name="QueueConnectionRule", uid="trigger-record-q-rule"
-    )
+    trigger_record_q_rule = templates["trigger_record_q_rule"]
     dfapp_qrules = [trigger_record_q_rule]
 
     # Net Rules
-    frag_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="frag-net-rule")
-    df_token_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="df-token-net-rule"
-    )
-    tpset_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="tpset-net-rule"
-    )
-    ti_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="ti-net-rule")
-    td_dfo_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="td-dfo-net-rule"
-    )
-    td_trb_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="td-trb-net-rule"
-    )
-    data_req_trig_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="data-req-trig-net-rule"
-    )
-    data_req_hsi_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="data-req-hsi-net-rule"
-    )
-    data_req_readout_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="data-req-readout-net-rule"
-    )
+    frag_net_rule = templates["frag_net_rule"]
+    df_token_net_rule = templates["df_token_net_rule"]
+    tpset_net_rule = templates["tpset_net_rule"]
+    ti_net_rule = templates["ti_net_rule"]
+    td_dfo_net_rule = templates["td_dfo_net_rule"]
+    td_trb_net_rule = templates["td_trb_net_rule"]
+    data_req_trig_net_rule = templates["data_req_trig_net_rule"]
+    data_req_hsi_net_rule = templates["data_req_hsi_net_rule"]
+    data_req_readout_net_rule = templates["data_req_readout_net_rule"]
     dfapp_netrules = [
         td_trb_net_rule,
         frag_net_rule,
@@ -101,9 +126,9 @@ def generate_dataflow(
     dfo_netrules = [td_dfo_net_rule, ti_net_rule, df_token_net_rule]
     tpw_netrules = [tpset_net_rule]
 
-    opmon_conf = db.get_dal(class_name="OpMonConf", uid="slow-all-monitoring")
+    opmon_conf = templates["opmon_conf"]
 
-    dfo_conf = db.get_dal(class_name="DFOConf", uid="dfoconf-01")
+    dfo_conf = templates["dfo_conf"]
     dfo = dal.DFOApplication(
         "dfo-01",
         runs_on=host,
@@ -115,9 +140,9 @@ def generate_dataflow(
     )
     db.update_dal(dfo)
 
-    trb_conf = db.get_dal(class_name="TRBConf", uid="trb-01")
-    dw_conf = db.get_dal(class_name="DataWriterConf", uid="dw-01")
-    dfhw = db.get_dal(class_name="DFHWConf", uid="dfhw-01")
+    trb_conf = templates["trb_conf"]
+    dw_conf = templates["dw_conf"]
+    dfhw = templates["dfhw"]
     dfapps = []
     for dfapp_idx in range(n_dfapps):
         dfapp_id = dfapp_idx + 1
@@ -153,9 +178,7 @@ def generate_dataflow(
 
     tpwapps = []
     if tpwriting_enabled:
-        tpw_writer_conf = db.get_dal(
-            class_name="TPStreamWriterConf", uid="tp-stream-writer-conf"
-        )
+        tpw_writer_conf = templates["tpw_writer_conf"]
 
         tpwapp = dal.TPStreamWriterApplication(
             "tp-stream-writer",
@@ -171,7 +194,7 @@ def generate_dataflow(
         tpwapps.append(tpwapp)
 
     if generate_segment:
-        fsm = db.get_dal(class_name="FSMconfiguration", uid="FSMconfiguration_noAction")
+        fsm = templates["fsm"]
         controller_service = dal.Service(
             "df-controller_control", protocol="grpc", port=0
         )
@@ -191,9 +214,6 @@ def generate_dataflow(
         )
         db.update_dal(seg)
 
-    db.commit()
-    return
-
 
 def generate_hsi(
     oksfile,
@@ -221,58 +241,62 @@ def generate_hsi(
         return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    _create_db(db, oksfile, includefiles)
+    host = _get_localhost(db, dal)
+    _build_hsi(db, dal, host, generate_segment)
+
+    db.commit()
+    return
 
-    hosts = []
-    for vhost in db.get_dals(class_name="VirtualHost"):
-        hosts.append(vhost.id)
-        if vhost.id == "vlocalhost":
-            host = vhost
-    if "vlocalhost" not in hosts:
-        cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
-        db.update_dal(cpus)
-        phdal = dal.PhysicalHost("localhost", contains=[cpus])
-        db.update_dal(phdal)
-        host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
-        db.update_dal(host)
-        hosts.append("vlocalhost")
+
+def _build_hsi(db, dal, host, generate_segment):
+    required = {
+        "hsi_control": ("Service", "hsi-01_control"),
+        "dataRequests": ("Service", "dataRequests"),
+        "tc_app_control": ("Service", "hsi-to-tc-app_control"),
+        "hsievents": ("Service", "HSIEvents"),
+        "hsi_source_id": ("SourceIDConf", "hsi-srcid-01"),
+        "hsi_tc_source_id": ("SourceIDConf", "hsi-tc-srcid-1"),
+        "hsi_dlh_queue_rule": ("QueueConnectionRule", "hsi-dlh-data-requests-queue-rule"),
+        "tc_net_rule": ("NetworkConnectionRule", "tc-net-rule"),
+        "hsi_rule": ("NetworkConnectionRule", "hsi-rule"),
+        "ts_hsi_net_rule": ("NetworkConnectionRule", "ts-hsi-net-rule"),
+        "data_req_hsi_net_rule": ("NetworkConnectionRule", "data-req-hsi-net-rule"),
+        "opmon_conf": ("OpMonConf", "slow-all-monitoring"),
+        "hsi_handler": ("DataHandlerConf", "def-hsi-handler"),
+        "fakehsi": ("FakeHSIEventGeneratorConf", "fakehsi"),
+        "hsi_to_tc_conf": ("HSI2TCTranslatorConf", "hsi-to-tc-conf"),
+    }
+    if generate_segment:
+        required["fsm"] = ("FSMconfiguration", "FSMconfiguration_noAction")
+    templates = db.prefetch(required)
 
     # Services
-    hsi_control = db.get_dal(class_name="Service", uid="hsi-01_control")
-    dataRequests = db.get_dal(class_name="Service", uid="dataRequests")
-    tc_app_control = db.get_dal(class_name="Service", uid="hsi-to-tc-app_control")
-    hsievents = db.get_dal(class_name="Service", uid="HSIEvents")
+    hsi_control = templates["hsi_control"]
+    dataRequests = templates["dataRequests"]
+    tc_app_control = templates["tc_app_control"]
+    hsievents = templates["hsievents"]
 
     # Source IDs
-    hsi_source_id = db.get_dal(class_name="SourceIDConf", uid="hsi-srcid-01")
-    hsi_tc_source_id = db.get_dal(class_name="SourceIDConf", uid="hsi-tc-srcid-1")
+    hsi_source_id = templates["hsi_source_id"]
+    hsi_tc_source_id = templates["hsi_tc_source_id"]
 
     # Queue Rules
-    hsi_dlh_queue_rule = db.get_dal(
-        class_name="QueueConnectionRule", uid="hsi-dlh-data-requests-queue-rule"
-    )
+    hsi_dlh_queue_rule = templates["hsi_dlh_queue_rule"]
     hsi_qrules = [hsi_dlh_queue_rule]
 
     # Net Rules
-    tc_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="tc-net-rule")
-    hsi_rule = db.get_dal(class_name="NetworkConnectionRule", uid="hsi-rule")
-    ts_hsi_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="ts-hsi-net-rule"
-    )
-    data_req_hsi_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="data-req-hsi-net-rule"
-    )
+    tc_net_rule = templates["tc_net_rule"]
+    hsi_rule = templates["hsi_rule"]
+    ts_hsi_net_rule = templates["ts_hsi_net_rule"]
+    data_req_hsi_net_rule = templates["data_req_hsi_net_rule"]
     hsi_netrules = [hsi_rule, data_req_hsi_net_rule, ts_hsi_net_rule]
     tc_netrules = [hsi_rule, tc_net_rule]
 
-    opmon_conf = db.get_dal(class_name="OpMonConf", uid="slow-all-monitoring")
-    hsi_handler = db.get_dal(class_name="DataHandlerConf", uid="def-hsi-handler")
-    fakehsi = db.get_dal(class_name="FakeHSIEventGeneratorConf", uid="fakehsi")
+    opmon_conf = templates["opmon_conf"]
+    hsi_handler = templates["hsi_handler"]
+    fakehsi = templates["fakehsi"]
 
     hsi = dal.FakeHSIApplication(
         "hsi-01",
@@ -288,7 +312,7 @@ def generate_hsi(
     )
     db.update_dal(hsi)
 
-    hsi_to_tc_conf = db.get_dal(class_name="HSI2TCTranslatorConf", uid="hsi-to-tc-conf")
+    hsi_to_tc_conf = templates["hsi_to_tc_conf"]
 
     hsi_to_tc = dal.HSIEventToTCApplication(
         "hsi-to-tc-app",
@@ -303,7 +327,7 @@ def generate_hsi(
     db.update_dal(hsi_to_tc)
 
     if generate_segment:
-        fsm = db.get_dal(class_name="FSMconfiguration", uid="FSMconfiguration_noAction")
+        fsm = templates["fsm"]
         controller_service = dal.Service(
             "hsi-controller_control", protocol="grpc", port=0
         )
@@ -323,9 +347,6 @@ def generate_hsi(
         )
         db.update_dal(seg)
 
-    db.commit()
-    return
-
 
 def generate_readout(
     readoutmap,
@@ -335,6 +356,7 @@ def generate_readout(
     emulated_file_name="asset://?checksum=e96fd6efd3f98a9a3bfaba32975b476e",
     tpg_enabled=True,
     hosts_to_use=[],
+    commit_interval=0,
 ):
     """Simple script to create an OKS configuration file for all
   ReadoutApplications defined in a readout map.
@@ -362,6 +384,10 @@ def generate_readout(
   NB: Currently FSM generation is not implemented so you must include
   an fsm file in order to generate a Segment
 
+   All objects are built in memory and the file is written by a single
+  commit at the end. A commit_interval > 0 additionally commits after
+  every commit_interval ReadoutApplications.
+
   """
 
     if not readoutmap.endswith(".data.xml"):
@@ -378,91 +404,71 @@ def generate_readout(
         readoutmap,
     ]
 
-    searchdirs = [path for path in os.environ["DUNEDAQ_DB_PATH"].split(":")]
-    searchdirs.append(os.path.dirname(oksfile))
-    for inc in include:
-        # print (f"Searching for {inc}")
-        match = False
-        inc = inc.removesuffix(".xml")
-        if inc.endswith(".data"):
-            sub_dirs = ["config", "data"]
-        elif inc.endswith(".schema"):
-            sub_dirs = ["schema"]
-        else:
-            sub_dirs = ["*"]
-            inc = inc + "*"
-        for path in searchdirs:
-            # print (f"   {path}/{inc}.xml")
-            matches = glob.glob(f"{inc}.xml", root_dir=path)
-            if len(matches) == 0:
-                for search_dir in sub_dirs:
-                    # print (f"   {path}/{search_dir}/{inc}.xml")
-                    matches = glob.glob(f"{search_dir}/{inc}.xml", root_dir=path)
-                    for filename in matches:
-                        if filename not in includefiles:
-                            print(f"Adding {filename} to include list")
-                            includefiles.append(filename)
-                        else:
-                            print(f"{filename} already in include list")
-                        match = True
-                        break
-                    if match:
-                        break
-                if match:
-                    break
-            else:
-                for filename in matches:
-                    if filename not in includefiles:
-                        print(f"Adding {filename} to include list")
-                        includefiles.append(filename)
-                    else:
-                        print(f"{filename} already in include list")
-                    match = True
-                    break
-
-        if not match:
-            print(f"Error could not find include file for {inc}")
-            return
+    res, extra_includes = find_oksincludes(include, os.path.dirname(oksfile))
+    if res:
+        includefiles += [inc for inc in extra_includes if inc not in includefiles]
+    else:
+        return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    _create_db(db, oksfile, includefiles)
+    if not _build_readout(db, dal, generate_segment, emulated_file_name, tpg_enabled, hosts_to_use, commit_interval):
+        return
+
+    db.commit()
+    return
+
+
+def _build_readout(
+    db,
+    dal,
+    generate_segment,
+    emulated_file_name="asset://?checksum=e96fd6efd3f98a9a3bfaba32975b476e",
+    tpg_enabled=True,
+    hosts_to_use=[],
+    commit_interval=0,
+):
+    """Create the ReadoutApplications (and optionally their Segment) for all
+    the DetectorToDaqConnections known to db.
 
+    Returns False if no ReadoutApplication could be generated.
+    """
     detector_connections = db.get_dals(class_name="DetectorToDaqConnection")
 
-    try:
-        rule = db.get_dal(
-            class_name="NetworkConnectionRule", uid="data-req-readout-net-rule"
-        )
-    except:
-        print(
-            'Expected NetworkConnectionRule "data-req-readout-net-rule" not found in input databases!'
-        )
-    else:
-        netrules = [rule]
-        # Assume we have all the other rules we need
-        for rule in ["tpset-net-rule", "ts-net-rule", "ta-net-rule"]:
-            netrules.append(db.get_dal(class_name="NetworkConnectionRule", uid=rule))
-
-    try:
-        rule = db.get_dal(
-            class_name="QueueConnectionRule", uid="fd-dlh-data-requests-queue-rule"
-        )
-    except:
-        print(
-            'Expected QueueConnectionRule "fd-dlh-data-requests-queue-rule" not found in input databases!'
-        )
-    else:
-        qrules = [rule]
-        for rule in [
-            "fa-queue-rule",
-            "tp-queue-rule",
-        ]:
-            qrules.append(db.get_dal(class_name="QueueConnectionRule", uid=rule))
+    required = {
+        "data_req_readout_net_rule": ("NetworkConnectionRule", "data-req-readout-net-rule"),
+        "tpset_net_rule": ("NetworkConnectionRule", "tpset-net-rule"),
+        "ts_net_rule": ("NetworkConnectionRule", "ts-net-rule"),
+        "ta_net_rule": ("NetworkConnectionRule", "ta-net-rule"),
+        "fd_dlh_data_requests_queue_rule": ("QueueConnectionRule", "fd-dlh-data-requests-queue-rule"),
+        "fa_queue_rule": ("QueueConnectionRule", "fa-queue-rule"),
+        "tp_queue_rule": ("QueueConnectionRule", "tp-queue-rule"),
+        "opmon_conf": ("OpMonConf", "slow-all-monitoring"),
+        "dataRequests": ("Service", "dataRequests"),
+        "timeSyncs": ("Service", "timeSyncs"),
+        "triggerActivities": ("Service", "triggerActivities"),
+        "triggerPrimitives": ("Service", "triggerPrimitives"),
+        "readout_start": ("ActionPlan", "readout-start"),
+        "readout_stop": ("ActionPlan", "readout-stop"),
+    }
+    if tpg_enabled:
+        required["tphandler"] = ("DataHandlerConf", "def-tp-handler")
+    if generate_segment:
+        required["fsm"] = ("FSMconfiguration", "FSMconfiguration_noAction")
+    templates = db.prefetch(required)
+
+    netrules = [
+        templates["data_req_readout_net_rule"],
+        templates["tpset_net_rule"],
+        templates["ts_net_rule"],
+        templates["ta_net_rule"],
+    ]
+    qrules = [
+        templates["fd_dlh_data_requests_queue_rule"],
+        templates["fa_queue_rule"],
+        templates["tp_queue_rule"],
+    ]
 
     hosts = []
     if len(hosts_to_use) == 0:
@@ -486,7 +492,7 @@ def generate_readout(
     rohw = dal.RoHwConfig(f"rohw-{detector_connections[0].id}")
     db.update_dal(rohw)
 
-    opmon_conf = db.get_dal(class_name="OpMonConf", uid="slow-all-monitoring")
+    opmon_conf = templates["opmon_conf"]
 
     appnum = 0
     nicrec = None
@@ -507,8 +513,6 @@ def generate_readout(
         if det_id == 0:
             raise Exception(f"Unable to determine detector ID from Hardware Map!")
 
-        tphandler = db.get_dal(class_name="DataHandlerConf", uid="def-tp-handler")
-
         if det_id == 2:
             if "DAPHNEStream" in emulated_file_name:
                 linkhandler = db.get_dal(
@@ -633,19 +637,17 @@ def generate_readout(
             )
             continue
 
-        db.commit()
-
         # Services
-        dataRequests = db.get_dal(class_name="Service", uid="dataRequests")
-        timeSyncs = db.get_dal(class_name="Service", uid="timeSyncs")
-        triggerActivities = db.get_dal(class_name="Service", uid="triggerActivities")
-        triggerPrimitives = db.get_dal(class_name="Service", uid="triggerPrimitives")
+        dataRequests = templates["dataRequests"]
+        timeSyncs = templates["timeSyncs"]
+        triggerActivities = templates["triggerActivities"]
+        triggerPrimitives = templates["triggerPrimitives"]
         ru_control = dal.Service(f"ru-{connection.id}_control", protocol="rest", port=0)
         db.update_dal(ru_control)
 
         # Action Plans
-        readout_start = db.get_dal(class_name="ActionPlan", uid="readout-start")
-        readout_stop = db.get_dal(class_name="ActionPlan", uid="readout-stop")
+        readout_start = templates["readout_start"]
+        readout_stop = templates["readout_stop"]
 
         ru = dal.ReadoutApplication(
             f"ru-{connection.id}",
@@ -664,7 +666,7 @@ def generate_readout(
             action_plans=[readout_start, readout_stop],
         )
         if tpg_enabled:
-            ru.tp_handler = tphandler
+            ru.tp_handler = templates["tphandler"]
             tp_sources = []
             tpbaseid = (appnum * 3) + 100
             for plane in range(3):
@@ -679,22 +681,20 @@ def generate_readout(
         appnum = appnum + 1
         print(f"{ru=}")
         db.update_dal(ru)
-        db.commit()
         ruapps.append(ru)
+        if commit_interval > 0 and appnum % commit_interval == 0:
+            db.commit()
     if appnum == 0:
         print(f"No ReadoutApplications generated\n")
-        return
-
-    db.commit()
+        return False
 
     if generate_segment:
         # fsm = db.get_dal(class_name="FSMconfiguration", uid="fsmConf-test")
-        fsm = db.get_dal(class_name="FSMconfiguration", uid="FSMconfiguration_noAction")
+        fsm = templates["fsm"]
         controller_service = dal.Service(
             "ru-controller_control", protocol="grpc", port=0
         )
         db.update_dal(controller_service)
-        db.commit()
         controller = dal.RCApplication(
             "ru-controller",
             application_name="drunc-controller",
@@ -704,14 +704,11 @@ def generate_readout(
             exposes_service=[controller_service],
         )
         db.update_dal(controller)
-        db.commit()
 
         seg = dal.Segment(f"ru-segment", controller=controller, applications=ruapps)
         db.update_dal(seg)
-        db.commit()
 
-    db.commit()
-    return
+    return True
 
 
 def generate_fakedata(
@@ -736,55 +733,38 @@ def generate_fakedata(
         return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    _create_db(db, oksfile, includefiles)
+    host = _get_localhost(db, dal)
+    _build_fakedata(db, dal, host, generate_segment, n_streams, n_apps, det_id)
 
-    hosts = []
-    for vhost in db.get_dals(class_name="VirtualHost"):
-        hosts.append(vhost.id)
-        if vhost.id == "vlocalhost":
-            host = vhost
-    if "vlocalhost" not in hosts:
-        cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
-        db.update_dal(cpus)
-        phdal = dal.PhysicalHost("localhost", contains=[cpus])
-        db.update_dal(phdal)
-        host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
-        db.update_dal(host)
-        hosts.append("vlocalhost")
+    db.commit()
+    return
+
+
+def _build_fakedata(db, dal, host, generate_segment, n_streams, n_apps, det_id):
+    required = {
+        "dataRequests": ("Service", "dataRequests"),
+        "timeSyncs": ("Service", "timeSyncs"),
+        "opmon_conf": ("OpMonConf", "slow-all-monitoring"),
+        "data_req_readout_net_rule": ("NetworkConnectionRule", "data-req-readout-net-rule"),
+        "ts_fdp_net_rule": ("NetworkConnectionRule", "ts-fdp-net-rule"),
+        "fpdm_data_requests_queue_rule": ("QueueConnectionRule", "fpdm-data-requests-queue-rule"),
+        "fa_queue_rule": ("QueueConnectionRule", "fa-queue-rule"),
+    }
+    if generate_segment:
+        required["fsm"] = ("FSMconfiguration", "FSMconfiguration_noAction")
+    templates = db.prefetch(required)
 
     source_id = 0
     fakeapps = []
     # Services
-    dataRequests = db.get_dal(class_name="Service", uid="dataRequests")
-    timeSyncs = db.get_dal(class_name="Service", uid="timeSyncs")
-    opmon_conf = db.get_dal(class_name="OpMonConf", uid="slow-all-monitoring")
+    dataRequests = templates["dataRequests"]
+    timeSyncs = templates["timeSyncs"]
+    opmon_conf = templates["opmon_conf"]
 
-    rule = db.get_dal(
-            class_name="NetworkConnectionRule", uid="data-req-readout-net-rule"
-        )
-    netrules = [rule]
-    for rule in ["ts-fdp-net-rule"]:
-        netrules.append(db.get_dal(class_name="NetworkConnectionRule", uid=rule))
-
-    try:
-        rule = db.get_dal(
-            class_name="QueueConnectionRule", uid="fpdm-data-requests-queue-rule"
-        )
-    except:
-        print(
-            'Expected QueueConnectionRule "fpdm-data-requests-queue-rule" not found in input databases!'
-        )
-    else:
-        qrules = [rule]
-        for rule in [
-            "fa-queue-rule",
-        ]:
-            qrules.append(db.get_dal(class_name="QueueConnectionRule", uid=rule))
+    netrules = [templates["data_req_readout_net_rule"], templates["ts_fdp_net_rule"]]
+    qrules = [templates["fpdm_data_requests_queue_rule"], templates["fa_queue_rule"]]
 
     frame_size=0
     fragment_type=""
@@ -828,7 +808,7 @@ def generate_fakedata(
 
 
     if generate_segment:
-        fsm = db.get_dal(class_name="FSMconfiguration", uid="FSMconfiguration_noAction")
+        fsm = templates["fsm"]
         controller_service = dal.Service(
             "ru-controller_control", protocol="grpc", port=0
         )
@@ -850,9 +830,6 @@ def generate_fakedata(
         )
         db.update_dal(seg)
 
-    db.commit()
-    return
-
 
 def generate_trigger(
     oksfile,
@@ -881,57 +858,73 @@ def generate_trigger(
         return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    _create_db(db, oksfile, includefiles)
+    host = _get_localhost(db, dal)
+    _build_trigger(db, dal, host, generate_segment, tpg_enabled, hsi_enabled)
 
-    hosts = []
-    for vhost in db.get_dals(class_name="VirtualHost"):
-        hosts.append(vhost.id)
-        if vhost.id == "vlocalhost":
-            host = vhost
-    if "vlocalhost" not in hosts:
-        cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
-        db.update_dal(cpus)
-        phdal = dal.PhysicalHost("localhost", contains=[cpus])
-        db.update_dal(phdal)
-        host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
-        db.update_dal(host)
-        hosts.append("vlocalhost")
+    db.commit()
+    return
+
+
+def _build_trigger(db, dal, host, generate_segment, tpg_enabled=True, hsi_enabled=False):
+    required = {
+        "mlt_control": ("Service", "mlt_control"),
+        "dataRequests": ("Service", "dataRequests"),
+        "tc_maker_control": ("Service", "tc-maker-1_control"),
+        "triggerActivities": ("Service", "triggerActivities"),
+        "triggerCandidates": ("Service", "triggerCandidates"),
+        "triggerInhibits": ("Service", "triggerInhibits"),
+        "mlt_source_id": ("SourceIDConf", "tc-srcid-1"),
+        "tc_source_id": ("SourceIDConf", "ta-srcid-1"),
+        "tc_queue_rule": ("QueueConnectionRule", "tc-queue-rule"),
+        "td_queue_rule": ("QueueConnectionRule", "td-queue-rule"),
+        "ta_queue_rule": ("QueueConnectionRule", "ta-queue-rule"),
+        "tc_net_rule": ("NetworkConnectionRule", "tc-net-rule"),
+        "ta_net_rule": ("NetworkConnectionRule", "ta-net-rule"),
+        "ts_net_rule": ("NetworkConnectionRule", "ts-net-rule"),
+        "ti_net_rule": ("NetworkConnectionRule", "ti-net-rule"),
+        "td_dfo_net_rule": ("NetworkConnectionRule", "td-dfo-net-rule"),
+        "data_req_trig_net_rule": ("NetworkConnectionRule", "data-req-trig-net-rule"),
+        "opmon_conf": ("OpMonConf", "slow-all-monitoring"),
+        "tc_subscriber": ("DataReaderConf", "tc-subscriber-1"),
+        "tc_handler": ("DataHandlerConf", "def-tc-handler"),
+        "mlt_conf": ("MLTConf", "def-mlt-conf"),
+        "random_tc_generator": ("RandomTCMakerConf", "random-tc-generator"),
+    }
+    if tpg_enabled:
+        required["ta_subscriber"] = ("DataReaderConf", "ta-subscriber-1")
+        required["ta_handler"] = ("DataHandlerConf", "def-ta-handler")
+    if generate_segment:
+        required["fsm"] = ("FSMconfiguration", "FSMconfiguration_noAction")
+    templates = db.prefetch(required)
 
     # Services
-    mlt_control = db.get_dal(class_name="Service", uid="mlt_control")
-    dataRequests = db.get_dal(class_name="Service", uid="dataRequests")
-    tc_maker_control = db.get_dal(class_name="Service", uid="tc-maker-1_control")
-    triggerActivities = db.get_dal(class_name="Service", uid="triggerActivities")
-    triggerCandidates = db.get_dal(class_name="Service", uid="triggerCandidates")
-    triggerInhibits = db.get_dal(class_name="Service", uid="triggerInhibits")
+    mlt_control = templates["mlt_control"]
+    dataRequests = templates["dataRequests"]
+    tc_maker_control = templates["tc_maker_control"]
+    triggerActivities = templates["triggerActivities"]
+    triggerCandidates = templates["triggerCandidates"]
+    triggerInhibits = templates["triggerInhibits"]
 
     # Source IDs
-    mlt_source_id = db.get_dal(class_name="SourceIDConf", uid="tc-srcid-1")
-    tc_source_id = db.get_dal(class_name="SourceIDConf", uid="ta-srcid-1")
+    mlt_source_id = templates["mlt_source_id"]
+    tc_source_id = templates["tc_source_id"]
 
     # Queue Rules
-    tc_queue_rule = db.get_dal(class_name="QueueConnectionRule", uid="tc-queue-rule")
-    td_queue_rule = db.get_dal(class_name="QueueConnectionRule", uid="td-queue-rule")
-    ta_queue_rule = db.get_dal(class_name="QueueConnectionRule", uid="ta-queue-rule")
+    tc_queue_rule = templates["tc_queue_rule"]
+    td_queue_rule = templates["td_queue_rule"]
+    ta_queue_rule = templates["ta_queue_rule"]
     mlt_qrules = [tc_queue_rule, td_queue_rule]
     tapp_qrules = [ta_queue_rule]
 
     # Net Rules
-    tc_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="tc-net-rule")
-    ta_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="ta-net-rule")
-    ts_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="ts-net-rule")
-    ti_net_rule = db.get_dal(class_name="NetworkConnectionRule", uid="ti-net-rule")
-    td_dfo_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="td-dfo-net-rule"
-    )
-    data_req_trig_net_rule = db.get_dal(
-        class_name="NetworkConnectionRule", uid="data-req-trig-net-rule"
-    )
+    tc_net_rule = templates["tc_net_rule"]
+    ta_net_rule = templates["ta_net_rule"]
+    ts_net_rule = templates["ts_net_rule"]
+    ti_net_rule = templates["ti_net_rule"]
+    td_dfo_net_rule = templates["td_dfo_net_rule"]
+    data_req_trig_net_rule = templates["data_req_trig_net_rule"]
     mlt_netrules = [
         tc_net_rule,
         ti_net_rule,
@@ -941,13 +934,11 @@ def generate_trigger(
     ]
     tapp_netrules = [ta_net_rule, tc_net_rule, data_req_trig_net_rule]
 
-    opmon_conf = db.get_dal(class_name="OpMonConf", uid="slow-all-monitoring")
-    tc_subscriber = db.get_dal(class_name="DataReaderConf", uid="tc-subscriber-1")
-    tc_handler = db.get_dal(class_name="DataHandlerConf", uid="def-tc-handler")
-    mlt_conf = db.get_dal(class_name="MLTConf", uid="def-mlt-conf")
-    random_tc_generator = db.get_dal(
-        class_name="RandomTCMakerConf", uid="random-tc-generator"
-    )
+    opmon_conf = templates["opmon_conf"]
+    tc_subscriber = templates["tc_subscriber"]
+    tc_handler = templates["tc_handler"]
+    mlt_conf = templates["mlt_conf"]
+    random_tc_generator = templates["random_tc_generator"]
     tc_confs = [] if hsi_enabled else [random_tc_generator]
 
     mlt = dal.MLTApplication(
@@ -967,8 +958,8 @@ def generate_trigger(
     db.update_dal(mlt)
 
     if tpg_enabled:
-        ta_subscriber = db.get_dal(class_name="DataReaderConf", uid="ta-subscriber-1")
-        ta_handler = db.get_dal(class_name="DataHandlerConf", uid="def-ta-handler")
+        ta_subscriber = templates["ta_subscriber"]
+        ta_handler = templates["ta_handler"]
 
         tcmaker = dal.TriggerApplication(
             "tc-maker-1",
@@ -985,7 +976,7 @@ def generate_trigger(
         db.update_dal(tcmaker)
 
     if generate_segment:
-        fsm = db.get_dal(class_name="FSMconfiguration", uid="FSMconfiguration_noAction")
+        fsm = templates["fsm"]
         controller_service = dal.Service(
             "trg-controller_control", protocol="grpc", port=0
         )
@@ -1007,9 +998,6 @@ def generate_trigger(
         )
         db.update_dal(seg)
 
-    db.commit()
-    return
-
 
 def generate_session(
     oksfile,
@@ -1037,28 +1025,46 @@ def generate_session(
         return
 
     dal = conffwk.dal.module("generated", includefiles)
-    db = conffwk.Configuration("oksconflibs")
-    if not oksfile.endswith(".data.xml"):
-        oksfile = oksfile + ".data.xml"
-    print(f"Creating OKS database file {oksfile} with includes {includefiles}")
-    db.create_db(oksfile, includefiles)
-    db.set_active(oksfile)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+    print(f"Session includes {includefiles}")
+    _create_db(db, oksfile, includefiles)
+    host = _get_localhost(db, dal)
+    _build_session(
+        db,
+        dal,
+        host,
+        session_name,
+        op_env,
+        connectivity_service_is_infrastructure_app,
+        disable_connectivity_service,
+    )
 
-    hosts = []
-    for vhost in db.get_dals(class_name="VirtualHost"):
-        hosts.append(vhost.id)
-        if vhost.id == "vlocalhost":
-            host = vhost
-    if "vlocalhost" not in hosts:
-        cpus = dal.ProcessingResource("cpus", cpu_cores=[0, 1, 2, 3])
-        db.update_dal(cpus)
-        phdal = dal.PhysicalHost("localhost", contains=[cpus])
-        db.update_dal(phdal)
-        host = dal.VirtualHost("vlocalhost", runs_on=phdal, uses=[cpus])
-        db.update_dal(host)
-        hosts.append("vlocalhost")
-
-    fsm = db.get_dal(class_name="FSMconfiguration", uid="fsmConf-test")
+    db.commit()
+    return
+
+
+def _build_session(
+    db,
+    dal,
+    host,
+    session_name,
+    op_env,
+    connectivity_service_is_infrastructure_app=True,
+    disable_connectivity_service=False,
+):
+    required = {
+        "fsm": ("FSMconfiguration", "fsmConf-test"),
+        "detconf": ("DetectorConfig", "dummy-detector"),
+        "opmon_svc": ("OpMonURI", "local-opmon-uri"),
+        "local_variables": ("VariableSet", "local-variables"),
+    }
+    if connectivity_service_is_infrastructure_app:
+        required["conn_svc"] = ("ConnectionService", "local-connection-server")
+    if not disable_connectivity_service:
+        required["conn_svc_cfg"] = ("ConnectivityService", "local-connectivity-service-config")
+    templates = db.prefetch(required)
+
+    fsm = templates["fsm"]
     controller_service = dal.Service("root-controller_control", protocol="grpc", port=0)
     db.update_dal(controller_service)
     controller = dal.RCApplication(
@@ -1075,12 +1081,12 @@ def generate_session(
     seg = dal.Segment(f"root-segment", controller=controller, segments=segments)
     db.update_dal(seg)
 
-    detconf = db.get_dal(class_name="DetectorConfig", uid="dummy-detector")
+    detconf = templates["detconf"]
 
     detconf.op_env = op_env
     db.update_dal(detconf)
 
-    opmon_svc = db.get_dal(class_name="OpMonURI", uid="local-opmon-uri")
+    opmon_svc = templates["opmon_svc"]
 
     trace_file_var = None
     TRACE_FILE = os.getenv("TRACE_FILE")
@@ -1092,14 +1098,10 @@ def generate_session(
 
     infrastructure_applications = []
     if connectivity_service_is_infrastructure_app:
-        conn_svc = db.get_dal(
-            class_name="ConnectionService", uid="local-connection-server"
-        )
+        conn_svc = templates["conn_svc"]
         infrastructure_applications.append(conn_svc)
 
-    env_vars_for_local_running = db.get_dal(
-        class_name="VariableSet", uid="local-variables"
-    ).contains
+    env_vars_for_local_running = list(templates["local_variables"].contains)
     if trace_file_var is not None:
         env_vars_for_local_running.append(trace_file_var)
 
@@ -1113,12 +1115,98 @@ def generate_session(
     )
 
     if not disable_connectivity_service:
-        conn_svc_cfg = db.get_dal(
-            class_name="ConnectivityService", uid="local-connectivity-service-config"
-        )
+        conn_svc_cfg = templates["conn_svc_cfg"]
         sessiondal.connectivity_service = conn_svc_cfg
 
     db.update_dal(sessiondal)
 
+
+def generate_full_session(
+    oksfile,
+    include,
+    session_name,
+    readoutmap,
+    op_env="test",
+    n_dfapps=1,
+    n_data_writers=1,
+    tpwriting_enabled=True,
+    tpg_enabled=True,
+    hsi_enabled=False,
+    hosts_to_use=[],
+    emulated_file_name="asset://?checksum=e96fd6efd3f98a9a3bfaba32975b476e",
+    connectivity_service_is_infrastructure_app=True,
+    disable_connectivity_service=False,
+):
+    """Create a complete session in a single process.
+
+      The readout, trigger, dataflow and (optionally) HSI segments are
+    written next to the session file as <session>-<segment>.data.xml and
+    included by it. Schema and include files are resolved and parsed once:
+    all the segment builders share the same conffwk.Configuration and dal
+    module, instead of each generate_* call building its own.
+    """
+
+    if not oksfile.endswith(".data.xml"):
+        oksfile = oksfile + ".data.xml"
+    if not readoutmap.endswith(".data.xml"):
+        readoutmap = readoutmap + ".data.xml"
+    basename = oksfile.removesuffix(".data.xml")
+
+    includefiles = [
+        "schema/confmodel/dunedaq.schema.xml",
+        "schema/appmodel/application.schema.xml",
+        "schema/appmodel/trigger.schema.xml",
+        "schema/appmodel/fdmodules.schema.xml",
+        "schema/appmodel/wiec.schema.xml",
+    ]
+
+    res, extra_includes = find_oksincludes(include, os.path.dirname(oksfile))
+    if res:
+        includefiles += [inc for inc in extra_includes if inc not in includefiles]
+    else:
+        return
+
+    dal = conffwk.dal.module("generated", includefiles)
+    db = CachedConfiguration(conffwk.Configuration("oksconflibs"))
+
+    # Readout first: it is the only segment that needs the readout map
+    readout_file = _create_db(db, f"{basename}-readout", includefiles + [readoutmap])
+    localhost_included = "vlocalhost" in [vhost.id for vhost in db.get_dals(class_name="VirtualHost")]
+    host = _get_localhost(db, dal)
+    if not _build_readout(db, dal, True, emulated_file_name, tpg_enabled, hosts_to_use):
+        return
+    segment_files = [readout_file]
+
+    # If vlocalhost was not included it has just been created in the
+    # readout file, which the other segments then need to include
+    segment_includes = includefiles
+    if not localhost_included:
+        db.commit()
+        segment_includes = includefiles + [os.path.basename(readout_file)]
+
+    if hsi_enabled:
+        segment_files.append(_create_db(db, f"{basename}-hsi", segment_includes))
+        _build_hsi(db, dal, host, True)
+
+    segment_files.append(_create_db(db, f"{basename}-trigger", segment_includes))
+    _build_trigger(db, dal, host, True, tpg_enabled, hsi_enabled)
+
+    segment_files.append(_create_db(db, f"{basename}-dataflow", segment_includes))
+    _build_dataflow(db, dal, host, n_dfapps, tpwriting_enabled, True, n_data_writers)
+
+    # The session file includes the segment files, so they must exist on disk
+    db.commit()
+
+    _create_db(db, oksfile, includefiles + [os.path.basename(f) for f in segment_files])
+    _build_session(
+        db,
+        dal,
+        host,
+        session_name,
+        op_env,
+        connectivity_service_is_infrastructure_app,
+        disable_connectivity_service,
+    )
+
     db.commit()
     return
@@ -6,7 +6,15 @@ import json
 import sys
 
 def generate_hwmap(oksfile, n_streams, n_apps = 1, det_id = 3, app_host = "localhost",
-                             eth_protocol = "udp", flx_mode = "fix_rate"):
+                             eth_protocol = "udp", flx_mode = "fix_rate", commit_interval = 0):
+    """Generate a hardware map with n_apps DetectorToDaqConnections of
+    n_streams streams each.
+
+    Objects are only added to the in-memory database while generating and
+    the file is written by a single commit at the end, so the cost grows
+    linearly with the number of streams. A commit_interval > 0 additionally
+    commits after every commit_interval streams.
+    """
 
     schemafiles = [
         "schema/confmodel/dunedaq.schema.xml",
@@ -44,7 +52,6 @@ def generate_hwmap(oksfile, n_streams, n_apps = 1, det_id = 3, app_host = "local
             )
             db.update_dal(stream)
             streams.append(stream)
-            db.commit()
 
             sender_dal = dal.FakeDataSender(
                 f"sender-{source_id}",
@@ -52,9 +59,10 @@ def generate_hwmap(oksfile, n_streams, n_apps = 1, det_id = 3, app_host = "local
             )
             db.update_dal(sender_dal)
             senders.append(sender_dal)
-            db.commit()
 
             source_id = source_id + 1
+            if commit_interval > 0 and source_id % commit_interval == 0:
+                db.commit()
 
         sender_set = dal.ResourceSetAND(f"senders-{app}", contains=senders)
         db.update_dal(sender_set)
@@ -1,25 +1,15 @@
-import conffwk
-import confmodel
-
-import os
-import glob
+from daqconf.session import SessionIndex
+from daqconf.snapshot import load_configuration
 
 
 def get_segment_apps(segment):
-    apps = []
-
-    for ss in segment.segments:
-        apps += get_segment_apps(ss)
-
-    for aa in segment.applications:
-        apps.append(aa.id)
-
-    return apps
+    """Ids of the applications of a segment and of its sub-segments, controllers excluded"""
+    return [a.id for a in SessionIndex.for_segment(segment).applications]
 
 
 def get_session_apps(oksfile, session_name=""):
     """Get the apps defined in the given session"""
-    session_db = conffwk.Configuration("oksconflibs:" + oksfile)
+    session_db = load_configuration(oksfile)
     if session_name == "":
         session_dals = session_db.get_dals(class_name="Session")
         if len(session_dals) == 0:
@@ -33,22 +23,19 @@ def get_session_apps(oksfile, session_name=""):
             print(f"Error could not find Session {session_name} in file {oksfile}")
             return
 
-    segment = session.segment
-
-    return get_segment_apps(segment)
+    return [a.id for a in SessionIndex(session).applications]
 
 
 def get_database_apps(oksfile):
 
     output = {}
-    session_db = conffwk.Configuration("oksconflibs:" + oksfile)
+    session_db = load_configuration(oksfile)
     session_dals = session_db.get_dals(class_name="Session")
     if len(session_dals) == 0:
         print(f"Error could not find any Session in file {oksfile}")
         return {}
 
     for session in session_dals:
-        segment = session.segment
-        output[session.id] = get_segment_apps(segment)
+        output[session.id] = [a.id for a in SessionIndex(session).applications]
 
     return output
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Graph algorithms shared by the configuration tools.
+
+Graphs are given as a mapping of node : iterable of successor nodes, nodes can
+be any hashable. Successors that are not keys of the mapping are treated as
+nodes without outgoing edges.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Hashable, Iterable, Mapping
+
+
+@dataclass
+class TopologicalOrder:
+    """Result of topological_order
+
+    order -- every node of the graph, each one after all of its predecessors.
+             Nodes on a cycle are kept together, in no particular order.
+    cycles -- groups of nodes that form cycles (strongly connected components)
+    cycle_of -- node : index in cycles, for the nodes that are on a cycle
+    """
+    order: list = field(default_factory=list)
+    cycles: list[list] = field(default_factory=list)
+    cycle_of: dict = field(default_factory=dict)
+
+    @property
+    def is_acyclic(self) -> bool:
+        return not self.cycles
+
+
+def _all_nodes(successors: Mapping[Hashable, Iterable[Hashable]]) -> dict:
+    """Ordered set of the nodes of the graph"""
+    nodes = dict.fromkeys(successors)
+    for succ in successors.values():
+        for node in succ:
+            if node not in nodes:
+                nodes[node] = None
+    return nodes
+
+
+def strongly_connected_components(successors: Mapping[Hashable, Iterable[Hashable]],
+                                  nodes: Iterable[Hashable] = None) -> list[list]:
+    """Strongly connected components of the graph, using an iterative version of
+    Tarjan's algorithm. Components are returned in reverse topological order,
+    i.e. a component comes before every component that has an edge into it.
+
+    Arguments:
+        successors -- graph as node : iterable of successors
+        nodes -- restrict the search to the subgraph made of these nodes
+    """
+    if nodes is None:
+        nodes = _all_nodes(successors)
+    else:
+        nodes = dict.fromkeys(nodes)
+
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors.get(root, ())))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in nodes:
+                    continue
+                if child not in index:
+                    index[child] = lowlink[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors.get(child, ()))))
+                    break
+                if child in on_stack:
+                    lowlink[node] = min(lowlink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+def topological_order(successors: Mapping[Hashable, Iterable[Hashable]]) -> TopologicalOrder:
+    """Topological sort of a graph that may contain cycles
+
+    Nodes are ordered with Kahn's algorithm. If some nodes cannot be placed
+    because they are on, or downstream of, a cycle, the remaining subgraph is
+    split into strongly connected components and these are appended in
+    topological order, so that every node still comes after its predecessors
+    outside of its own cycle.
+    """
+    nodes = _all_nodes(successors)
+    in_degree = dict.fromkeys(nodes, 0)
+    for succ in successors.values():
+        for node in succ:
+            in_degree[node] += 1
+
+    queue = deque(node for node, degree in in_degree.items() if degree == 0)
+    result = TopologicalOrder()
+    while queue:
+        node = queue.popleft()
+        result.order.append(node)
+        for child in successors.get(node, ()):
+            in_degree[child] -= 1
+            if in_degree[child] == 0:
+                queue.append(child)
+
+    if len(result.order) == len(nodes):
+        return result
+
+    placed = set(result.order)
+    remaining = [node for node in nodes if node not in placed]
+    for component in reversed(strongly_connected_components(successors, remaining)):
+        result.order += component
+        if len(component) > 1 or component[0] in successors.get(component[0], ()):
+            for node in component:
+                result.cycle_of[node] = len(result.cycles)
+            result.cycles.append(component)
+
+    return result
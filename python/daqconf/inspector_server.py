@@ -0,0 +1,131 @@
+"""
+Query protocol of the `daqconf_inspector serve` mode.
+
+A server keeps a configuration loaded and answers inspector commands on a
+local Unix socket, one request per connection:
+
+    client -> server: one JSON line {"options": [...], "args": [...], "width": int, "color_system": str|null}
+    server -> client: one JSON line {"output": str, "exit_code": int}
+
+This module only depends on the standard library, so that the client starts
+in a few tens of milliseconds.
+"""
+import hashlib
+import json
+import os
+import shutil
+import socket
+import socketserver
+
+from daqconf.utils import cache_dir
+
+
+def socket_path(config_file: str) -> str:
+    """Default location of the socket serving config_file"""
+    key = hashlib.sha1(os.path.realpath(config_file).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir(), "inspector", f"{key}.sock")
+
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FileWatcher:
+    """Detects changes on disk to the files a configuration was loaded from"""
+
+    def __init__(self, files):
+        self._stats = {f: _stat(f) for f in files}
+
+    @property
+    def files(self) -> list:
+        return list(self._stats)
+
+    def changed(self) -> list:
+        """Files modified, replaced or removed since the watcher was created"""
+        return [f for f, st in self._stats.items() if _stat(f) != st]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # Connection probe, see serve()
+            return
+        try:
+            request = json.loads(line)
+            args = list(request["args"])
+            options = list(request.get("options", []))
+        except (ValueError, KeyError, TypeError) as e:
+            output, exit_code = f"Malformed request: {e}\n", 2
+        else:
+            output, exit_code = self.server.handler(options, args, request.get("width"), request.get("color_system"))
+        self.wfile.write(json.dumps({"output": output, "exit_code": exit_code}).encode() + b"\n")
+
+
+class _Server(socketserver.UnixStreamServer):
+    # Requests are served one at a time: commands share the loaded configuration
+
+    def __init__(self, path: str, handler):
+        self.handler = handler
+        super().__init__(path, _RequestHandler)
+
+
+def serve(path: str, handler) -> None:
+    """Answer requests on the Unix socket path until interrupted
+
+    Arguments:
+        path -- socket file, created if needed
+        handler -- callable(options, args, width, color_system) -> (output, exit code),
+                   options being the inspector options preceding the configuration file
+
+    Raises:
+        RuntimeError if another server is already listening on path
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if os.path.exists(path):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.connect(path)
+            raise RuntimeError(f"A server is already listening on {path}")
+        except (ConnectionRefusedError, FileNotFoundError):
+            # Left behind by a server that did not shut down cleanly
+            os.unlink(path)
+
+    server = _Server(path, handler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+def query(path: str, args: list, width: int = None, color_system: str = None, options: list = None) -> tuple[str, int]:
+    """Run an inspector command on the server listening on path
+
+    Arguments:
+        args -- command and its arguments
+        options -- inspector options, e.g. ['--format', 'json']
+
+    Returns:
+        (output, exit code) of the command
+
+    Raises:
+        ConnectionError if no server is listening on path
+    """
+    if width is None:
+        width = shutil.get_terminal_size().columns
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise ConnectionError(f"No inspector server listening on {path}") from e
+        s.sendall(json.dumps({"options": list(options or []), "args": list(args), "width": width, "color_system": color_system}).encode() + b"\n")
+        with s.makefile("rb") as f:
+            response = json.loads(f.readline())
+    return response["output"], response["exit_code"]
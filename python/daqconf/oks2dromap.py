@@ -0,0 +1,173 @@
+import os
+import re
+import time
+
+from daqconf.record_writer import make_writer
+
+# Names given by dro_json_to_oks to the NIC objects, the hardware map does not reference hosts otherwise
+_RX_NIC_NAME = re.compile(r"^nic-(.+)$")
+_TX_NIC_NAME = re.compile(r"^nw-(.+)-\d+$")
+
+
+def _rx_host(receiver) -> str:
+    m = _RX_NIC_NAME.match(receiver.uses.id)
+    if m:
+        return m.group(1)
+    return receiver.id.removesuffix("-receiver")
+
+
+def _tx_host(nic) -> str:
+    m = _TX_NIC_NAME.match(nic.id)
+    return m.group(1) if m else nic.id
+
+
+def _connection_contents(connection):
+    """Receiver, senders and streams reachable from a DetectorToDaqConnection,
+    looking through ResourceSets"""
+    receiver = None
+    senders = []
+    streams = []
+    stack = list(reversed(connection.contains))
+    while stack:
+        res = stack.pop()
+        if res is None:
+            continue
+        types = res.oksTypes()
+        if "DetectorStream" in types:
+            streams.append(res)
+        elif "DetDataReceiver" in types:
+            receiver = res
+        elif "DetDataSender" in types:
+            senders.append(res)
+            stack += reversed(res.contains)
+        elif "ResourceSet" in types:
+            stack += reversed(res.contains)
+    return receiver, senders, streams
+
+
+def readout_map_entries(db, connections=None, source_id_offset: int = 0):
+    """Readout map entries, in the JSON format read by dro_json_to_oks, of the
+    streams of DetectorToDaqConnections
+
+    All the senders are indexed by stream first, so that streams are matched
+    to their sender whether the connection contains the senders (as
+    dro_json_to_oks_streaming and generate_hwmap do) or directly the streams.
+    Entries come grouped by connection and sender, as dro_json_to_oks expects.
+
+    Arguments:
+        db -- configuration (conffwk.Configuration or Snapshot)
+        connections -- DetectorToDaqConnections to export, default all
+        source_id_offset -- subtracted from the source ids, to undo the offset
+                            given to dro_json_to_oks
+    """
+    if connections is None:
+        connections = db.get_dals("DetectorToDaqConnection")
+
+    # stream id -> sender
+    sender_of = {}
+    for sender in db.get_dals("DetDataSender"):
+        for stream in sender.contains:
+            if stream is not None:
+                sender_of.setdefault(stream.id, sender)
+
+    exported = []
+    for connection in connections:
+        receiver, senders, streams = _connection_contents(connection)
+        if receiver is None:
+            print(f"Warning: {connection.id} has no receiver, skipping it")
+            continue
+        # Streams in sender order, then streams referenced directly
+        ordered = {}
+        for sender in senders:
+            for stream in sender.contains:
+                if stream is not None and "DetectorStream" in stream.oksTypes():
+                    ordered.setdefault(stream.id, stream)
+        for stream in streams:
+            ordered.setdefault(stream.id, stream)
+        if ordered:
+            exported.append((min(s.source_id for s in ordered.values()), receiver, list(ordered.values())))
+
+    for _, receiver, streams in sorted(exported, key=lambda x: x[0]):
+        is_felix = "FelixInterface" in receiver.oksTypes()
+        if not is_felix:
+            rx_pars = {
+                "rx_host": _rx_host(receiver),
+                "rx_mac": receiver.uses.mac_address,
+                "rx_ip": receiver.uses.ip_address,
+            }
+
+        for stream in streams:
+            geo_id = stream.geo_id
+            sender = sender_of.get(stream.id)
+            entry = {
+                "src_id": stream.source_id - source_id_offset,
+                "geo_id": {
+                    "det_id": geo_id.detector_id,
+                    "crate_id": geo_id.crate_id,
+                    "slot_id": geo_id.slot_id,
+                    "stream_id": geo_id.stream_id,
+                },
+            }
+            if is_felix:
+                entry["kind"] = "flx"
+                entry["parameters"] = {
+                    "protocol": getattr(sender, "protocol", None),
+                    "card": receiver.card,
+                    "slr": receiver.slr,
+                    "link": getattr(sender, "link", None),
+                }
+            else:
+                tx_nic = getattr(sender, "uses", None)
+                entry["kind"] = "eth"
+                entry["parameters"] = dict(rx_pars,
+                    tx_host=_tx_host(tx_nic) if tx_nic is not None else None,
+                    tx_mac=tx_nic.mac_address if tx_nic is not None else None,
+                    tx_ip=tx_nic.ip_address if tx_nic is not None else None,
+                )
+            yield entry
+
+
+def session_connections(session) -> list:
+    """DetectorToDaqConnections read out by the enabled ReadoutApplications of a session"""
+    from daqconf.session import SessionIndex, SessionState
+
+    state = SessionState(session)
+    connections = {}
+    for app in SessionIndex(session).apps_of_class("ReadoutApplication"):
+        if state.is_disabled(app):
+            continue
+        for d2d in app.contains:
+            if d2d is not None and "DetectorToDaqConnection" in d2d.oksTypes() and not state.is_disabled(d2d):
+                connections.setdefault(d2d.id, d2d)
+    return list(connections.values())
+
+
+def oks_to_dro_json(oksfile, jsonfile="", source_id_offset=0, session_name=None, use_snapshot=True):
+    """Export the hardware map of an OKS configuration to a JSON readout map
+    file, the reverse of dro_json_to_oks
+
+    Arguments:
+        session_name -- only export the connections read out by this Session
+    """
+    from daqconf.snapshot import load_configuration
+
+    start = time.perf_counter()
+    if jsonfile == "":
+        jsonfile = os.path.basename(oksfile).removesuffix(".data.xml") + ".json"
+
+    db = load_configuration(oksfile, use_snapshot)
+
+    connections = None
+    if session_name is not None:
+        try:
+            session = db.get_dal("Session", session_name)
+        except RuntimeError:
+            print(f"Error could not find Session {session_name} in file {oksfile}")
+            return
+        connections = session_connections(session)
+
+    with open(jsonfile, "w") as f, make_writer("json", file=f) as writer:
+        writer.write_all(readout_map_entries(db, connections, source_id_offset))
+
+    print(f"Exported {writer.count} streams from {oksfile} to {jsonfile} in {time.perf_counter() - start:.1f} s")
+    return writer.count
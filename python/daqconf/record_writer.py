@@ -0,0 +1,102 @@
+"""
+Streaming writers of machine readable records, used by the --format option of
+the inspection tools. Records are dictionaries and are written out as soon as
+they are produced:
+
+  - jsonl: one JSON object per line
+  - json: a JSON array of objects
+  - csv: a header line followed by one row per record; lists and dictionaries
+         are JSON encoded in their cell
+"""
+import csv
+import json
+import sys
+
+FORMATS = ('json', 'jsonl', 'csv')
+
+
+def _to_json(value) -> str:
+    return json.dumps(value, default=str)
+
+
+class RecordWriter:
+    """Base class of the writers, usable as a context manager"""
+
+    def __init__(self, file=None):
+        self._file = sys.stdout if file is None else file
+        self.count = 0
+
+    def write(self, record: dict) -> None:
+        self._write(record)
+        self.count += 1
+
+    def write_all(self, records) -> None:
+        for record in records:
+            self.write(record)
+
+    def _write(self, record: dict) -> None:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonLinesWriter(RecordWriter):
+
+    def _write(self, record):
+        self._file.write(_to_json(record) + '\n')
+
+
+class JsonWriter(RecordWriter):
+
+    def _write(self, record):
+        self._file.write(('[\n' if self.count == 0 else ',\n') + _to_json(record))
+
+    def close(self):
+        self._file.write('[]\n' if self.count == 0 else '\n]\n')
+        super().close()
+
+
+class CsvWriter(RecordWriter):
+    """Columns are the given fields, or the keys of the first record"""
+
+    def __init__(self, file=None, fields: list = None):
+        super().__init__(file)
+        self._fields = fields
+        self._writer = None
+
+    def _write(self, record):
+        if self._writer is None:
+            self._writer = csv.DictWriter(self._file, fieldnames=self._fields or list(record), extrasaction='ignore')
+            self._writer.writeheader()
+        self._writer.writerow({k: _to_json(v) if isinstance(v, (list, tuple, dict)) else v for k, v in record.items()})
+
+    def close(self):
+        if self._writer is None and self._fields:
+            csv.DictWriter(self._file, fieldnames=self._fields).writeheader()
+        super().close()
+
+
+def make_writer(format: str, file=None, fields: list = None) -> RecordWriter:
+    """Writer for one of FORMATS
+
+    Arguments:
+        format -- output format
+        file -- output stream, default sys.stdout
+        fields -- csv columns, in order
+    """
+    match format:
+        case 'json':
+            return JsonWriter(file)
+        case 'jsonl':
+            return JsonLinesWriter(file)
+        case 'csv':
+            return CsvWriter(file, fields)
+        case _:
+            raise ValueError(f"Unknown record format '{format}', expected one of {FORMATS}")
@@ -1,17 +1,260 @@
 import conffwk
+import fnmatch
+import re
+
+from daqconf.graph_utils import topological_order
 
 def get_segment_apps(segment):
-    apps = []
+    """Applications and controllers of a segment and of its sub-segments, see SessionIndex.apps"""
+    return SessionIndex.for_segment(segment).apps
+
+
+class SessionIndex:
+    """Applications of a Session, indexed in a single iterative walk of its segments.
+
+    apps lists the applications and controllers in the order of the segment
+    tree: the contents of the sub-segments first, then the applications of the
+    segment and last its controller. Lookups by class, host, segment and
+    controller are dictionary accesses; the applications of a segment and of
+    its sub-segments are a contiguous slice of apps.
+
+    The index does not follow changes made to the configuration afterwards.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self.__build(session.segment)
+
+    @classmethod
+    def for_segment(cls, segment) -> "SessionIndex":
+        """Index of the segment tree below segment, outside of any session"""
+        index = cls.__new__(cls)
+        index._session = None
+        index.__build(segment)
+        return index
+
+    def __build(self, top_segment):
+        self._top_segment = top_segment
+        self._apps = []
+        # segment id -> segment
+        self._segments = {}
+        # segment id -> (start, end) of its subtree in apps
+        self._subtree = {}
+        # segment id -> applications and controller of the segment itself
+        self._own_apps = {}
+        # application id -> id of the segment holding it
+        self._segment_of = {}
+        # controller id -> segment ids it controls
+        self._controlled_segments = {}
+        self._controller_ids = set()
+        self._by_class = {}
+        self._by_host = {}
+
+        stack = [(top_segment, False)]
+        while stack:
+            segment, visited = stack.pop()
+            if not visited:
+                self._segments[segment.id] = segment
+                self._subtree[segment.id] = (len(self._apps), None)
+                stack.append((segment, True))
+                stack += [(ss, False) for ss in reversed(segment.segments) if ss is not None]
+                continue
+
+            own = [a for a in segment.applications if a is not None]
+            if segment.controller is not None:
+                own.append(segment.controller)
+                self._controller_ids.add(segment.controller.id)
+                self._controlled_segments.setdefault(segment.controller.id, []).append(segment.id)
+            self._own_apps[segment.id] = own
+            for app in own:
+                self.__add(app, segment)
+            self._subtree[segment.id] = (self._subtree[segment.id][0], len(self._apps))
+
+    def __add(self, app, segment):
+        self._apps.append(app)
+        self._segment_of.setdefault(app.id, segment.id)
+        for class_name in app.oksTypes():
+            self._by_class.setdefault(class_name, []).append(app)
+
+        vhost = getattr(app, "runs_on", None)
+        if vhost is not None:
+            self._by_host.setdefault(vhost.id, []).append(app)
+            if vhost.runs_on is not None and vhost.runs_on.id != vhost.id:
+                self._by_host.setdefault(vhost.runs_on.id, []).append(app)
+
+    @property
+    def session(self):
+        return self._session
+
+    @property
+    def apps(self) -> list:
+        """All the applications and controllers"""
+        return list(self._apps)
+
+    @property
+    def app_ids(self) -> list:
+        return [a.id for a in self._apps]
+
+    @property
+    def applications(self) -> list:
+        """Applications, segment controllers excluded"""
+        return [a for a in self._apps if a.id not in self._controller_ids]
+
+    @property
+    def controllers(self) -> list:
+        return [a for a in self._apps if a.id in self._controller_ids]
+
+    @property
+    def segments(self) -> dict:
+        """Segment id : segment, for all the segments"""
+        return dict(self._segments)
+
+    def apps_of_class(self, class_name: str) -> list:
+        """Applications of class_name or of a class derived from it"""
+        return list(self._by_class.get(class_name, []))
+
+    def apps_on_host(self, host: str) -> list:
+        """Applications running on a VirtualHost, or on any VirtualHost of a PhysicalHost"""
+        return list(self._by_host.get(host, []))
+
+    def apps_in_segment(self, segment_id: str, recursive: bool = True) -> list:
+        """Applications and controllers of a segment, and of its sub-segments if recursive"""
+        if segment_id not in self._segments:
+            raise KeyError(f"Segment {segment_id} not found")
+        if not recursive:
+            return list(self._own_apps[segment_id])
+        start, end = self._subtree[segment_id]
+        return self._apps[start:end]
+
+    def segment_of(self, app_id: str) -> str:
+        """Id of the segment holding an application or controller"""
+        return self._segment_of[app_id]
+
+    def controller(self, segment_id: str):
+        """Controller of a segment"""
+        return self._segments[segment_id].controller
+
+    def controlled_by(self, controller_id: str) -> list:
+        """Applications and sub-segment controllers under the control of a controller"""
+        controlled = []
+        for segment_id in self._controlled_segments.get(controller_id, []):
+            segment = self._segments[segment_id]
+            controlled += [a for a in segment.applications if a is not None]
+            controlled += [ss.controller for ss in segment.segments if ss is not None and ss.controller is not None]
+        return controlled
+
+
+def _structure_children(obj):
+    """Components whose status follows the status of obj: the contents of
+    Segments and ResourceSets"""
+    types = obj.oksTypes()
+    children = []
+    if "Segment" in types:
+        children += obj.segments + obj.applications + [obj.controller]
+    if "ResourceSet" in types:
+        children += obj.contains
+    return [c for c in children if c is not None]
+
+
+class SessionState:
+    """Enabled/disabled status of every Component of a Session, computed once.
+
+    Follows the rules of confmodel's component_disabled:
+      - the objects in the Session disabled relationship are disabled, together
+        with everything contained in them when they are Segments or ResourceSets;
+      - a ResourceSetAND is disabled when any of its resources is disabled,
+        a ResourceSetOR when all of them are; the rule is applied until no more
+        objects get disabled.
+
+    status() returns 1 for enabled Components, -1 for Components directly
+    disabled (listed in the Session disabled relationship), 0 for Components
+    disabled by the rules above and None for objects that are not Components.
+    """
+
+    ENABLED = 1
+    INDIRECTLY_DISABLED = 0
+    DIRECTLY_DISABLED = -1
+
+    def __init__(self, session):
+        self._session = session
+        # (class name, uid) -> dal, for all the disabled objects
+        self._disabled = {}
+        self._directly_disabled = {(d.className(), d.id) for d in session.disabled if d is not None}
 
-    for ss in segment.segments:
-        apps += get_segment_apps(ss)
+        # Containment structure of the session, as (class name, uid) -> children
+        children = {}
+        dals = {}
+        stack = [session.segment] + [d for d in session.disabled if d is not None]
+        while stack:
+            obj = stack.pop()
+            key = (obj.className(), obj.id)
+            if key in children:
+                continue
+            dals[key] = obj
+            children[key] = []
+            for child in _structure_children(obj):
+                children[key].append((child.className(), child.id))
+                stack.append(child)
+        self._children = children
+        self._dals = dals
 
-    for aa in segment.applications:
-        apps.append(aa)
-    
-    apps.append(segment.controller)
+        for key in self._directly_disabled:
+            self.__disable_tree(key)
 
-    return apps
+        # Visit sets after their resources, so that most changes propagate in a single pass
+        rule_sets = []
+        for key in reversed(topological_order(children).order):
+            types = dals[key].oksTypes()
+            if "ResourceSetAND" in types or "ResourceSetOR" in types:
+                rule_sets.append((key, "ResourceSetAND" in types))
+
+        changed = True
+        while changed:
+            changed = False
+            for key, is_and in rule_sets:
+                if key in self._disabled:
+                    continue
+                resources = children[key]
+                if is_and:
+                    disable = any(r in self._disabled for r in resources)
+                else:
+                    disable = bool(resources) and all(r in self._disabled for r in resources)
+                if disable:
+                    self.__disable_tree(key)
+                    changed = True
+
+    def __disable_tree(self, key):
+        """Disable an object and everything it contains"""
+        stack = [key]
+        while stack:
+            key = stack.pop()
+            if key in self._disabled:
+                continue
+            self._disabled[key] = self._dals.get(key)
+            stack += self._children.get(key, [])
+
+    @property
+    def session(self):
+        return self._session
+
+    def is_disabled(self, obj) -> bool:
+        return (obj.className(), obj.id) in self._disabled
+
+    def status(self, obj):
+        """1: enabled, 0: indirectly disabled, -1: directly disabled, None: not a Component"""
+        if not obj.isDalType("Component"):
+            return None
+        key = (obj.className(), obj.id)
+        if key not in self._disabled:
+            return self.ENABLED
+        if key in self._directly_disabled:
+            return self.DIRECTLY_DISABLED
+        return self.INDIRECTLY_DISABLED
+
+    @property
+    def disabled(self) -> list:
+        """All the disabled objects of the session"""
+        return [d for d in self._disabled.values() if d is not None]
 
 
 def get_session_apps(confdb, session_name=""):
@@ -29,9 +272,7 @@ def get_session_apps(confdb, session_name=""):
             print(f"Error could not find Session {session_name} in file {confdb.databases}")
             return
 
-    segment = session.segment
-
-    return get_segment_apps(segment)
+    return SessionIndex(session).apps
 
 
 def get_apps_in_any_session(confdb):
@@ -43,15 +284,83 @@ def get_apps_in_any_session(confdb):
         return {}
 
     for session in session_dals:
-        segment = session.segment
-        output[session.id] = get_segment_apps(segment)
+        output[session.id] = SessionIndex(session).apps
 
     return output
 
 
-def enable_resource_in_session(db, session_name: str, resource: list[str], disable: bool):
+class _SessionView:
+    """A Session with a different disabled relationship, used for dry runs"""
+
+    def __init__(self, session, disabled):
+        self._session = session
+        self.disabled = disabled
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def select_resources(db, patterns: list[str], classes: list[str] = None, regex: bool = False):
+    """Select ResourceBase objects by uid
+
+    Arguments:
+        db -- configuration
+        patterns -- uids or glob patterns, or regular expressions matching the
+                    whole uid if regex is True
+        classes -- only select objects of these classes or of classes derived from them
+
+    Returns:
+        (selected resources, patterns that did not match any resource)
+    """
+    literal = []
+    compiled = []
+    for p in patterns:
+        if regex:
+            compiled.append((p, re.compile(p)))
+        elif any(c in p for c in "*?["):
+            compiled.append((p, re.compile(fnmatch.translate(p))))
+        elif p not in literal:
+            literal.append(p)
+
+    matched = set()
+    selected = {}
+    # Uids are looked up directly, all the resources are only scanned for patterns
+    for uid in literal:
+        try:
+            res = db.get_dal("ResourceBase", uid)
+        except RuntimeError:
+            continue
+        if classes and not any(res.isDalType(c) for c in classes):
+            continue
+        matched.add(uid)
+        selected.setdefault((res.className(), res.id), res)
+
+    if compiled:
+        for res in db.get_dals("ResourceBase"):
+            if classes and not any(res.isDalType(c) for c in classes):
+                continue
+
+            hits = [p for p, rx in compiled if rx.fullmatch(res.id)]
+            if hits:
+                matched.update(hits)
+                selected.setdefault((res.className(), res.id), res)
+
+    return list(selected.values()), [p for p in patterns if p not in matched]
+
+
+def enable_resource_in_session(db, session_name: str, resource: list[str], disable: bool,
+                               regex: bool = False, classes: list[str] = None, dry_run: bool = False):
     """Script to enable or disable (-d) Resources from the first Session of the
-    specified OKS database file"""
+    specified OKS database file
+
+    Resources are selected with select_resources. The Session is updated and
+    committed once; with dry_run the change is not applied and the resulting
+    disabled objects, directly or through the Segments and ResourceSets
+    containing them, are printed instead.
+
+    Returns:
+        list of the resources added to or removed from the disabled relationship
+    """
     if session_name == "":
         session_dals = db.get_dals(class_name="Session")
         if len(session_dals) == 0:
@@ -64,34 +373,50 @@ def enable_resource_in_session(db, session_name: str, resource: list[str], disab
         except:
             print(f"Error could not find Session {session_name} in file {db.databases}")
             return
-        
-    disabled = session.disabled
-    for res in resource:
-        try:
-            res_dal = db.get_dal("ResourceBase", res)
-        except:
-            print(f"Error could not find Resource {res} in file {db.databases}")
-            continue
 
+    selected, unmatched = select_resources(db, resource, classes, regex)
+    for res in unmatched:
+        print(f"Error could not find Resource {res} in file {db.databases}")
+
+    disabled = [d for d in session.disabled if d is not None]
+    disabled_keys = {(d.className(), d.id) for d in disabled}
+
+    changed = []
+    for res_dal in selected:
+        key = (res_dal.className(), res_dal.id)
         if disable:
-            if res_dal in disabled:
-                print(
-                    f"{res} is already in disabled relationship of Session {session.id}"
-                )
+            if key in disabled_keys:
+                print(f"{res_dal.id} is already in disabled relationship of Session {session.id}")
             else:
                 # Add to the Segment's disabled list
-                print(f"Adding {res} to disabled relationship of Session {session.id}")
+                print(f"Adding {res_dal.id} to disabled relationship of Session {session.id}")
                 disabled.append(res_dal)
+                disabled_keys.add(key)
+                changed.append(res_dal)
         else:
-            if res_dal not in disabled:
-                print(f"{res} is not in disabled relationship of Session {session.id}")
+            if key not in disabled_keys:
+                print(f"{res_dal.id} is not in disabled relationship of Session {session.id}")
             else:
                 # Remove from the Segments disabled list
-                print(
-                    f"Removing {res} from disabled relationship of Session {session.id}"
-                )
-                disabled.remove(res_dal)
-    session.disabled = disabled
-    db.update_dal(session)
-    db.commit()
+                print(f"Removing {res_dal.id} from disabled relationship of Session {session.id}")
+                disabled_keys.discard(key)
+                changed.append(res_dal)
+
+    if not disable:
+        disabled = [d for d in disabled if (d.className(), d.id) in disabled_keys]
+
+    if dry_run:
+        state = SessionState(_SessionView(session, disabled))
+        closure = sorted(state.disabled, key=lambda d: (d.className(), d.id))
+        print(f"Dry run: {len(changed)} change(s), {len(disabled)} object(s) in the disabled relationship "
+              f"of Session {session.id}, {len(closure)} disabled in total:")
+        for d in closure:
+            marker = "directly" if (d.className(), d.id) in disabled_keys else "indirectly"
+            print(f"  {d.id}@{d.className()} ({marker})")
+        return changed
 
+    if changed:
+        session.disabled = disabled
+        db.update_dal(session)
+        db.commit()
+    return changed
@@ -0,0 +1,453 @@
+"""
+Binary snapshots of OKS configurations for fast read-only access.
+
+Parsing the full OKS XML tree with conffwk dominates the start-up time of
+the read-only tools. A snapshot stores the loaded object graph in a single
+file in the daqconf cache directory:
+
+    magic | header length | pickled header | one pickled blob per object
+
+The header holds the schema, the content hashes of every file the
+configuration was read from and an index of (class name, uid) to the
+position of the object blob. Snapshot files are memory mapped and each
+object is only decoded when one of its members is first accessed.
+
+A snapshot is used only while every file it was made from is unchanged:
+files whose size and modification time differ from the recorded ones are
+hashed again and compared with the recorded sha256. Every include is also
+resolved again, so that a file shadowing an included one (next to the
+including file or earlier in DUNEDAQ_DB_PATH) invalidates the snapshot.
+
+Snapshot objects mimic the read-only part of the conffwk Configuration and
+dal APIs, they cannot be modified or committed.
+"""
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import time
+
+from daqconf.utils import cache_dir, resolve_db_path
+
+_MAGIC = b"DAQCSNP1"
+_LENGTH = struct.Struct("<Q")
+_VERSION = 2
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_signature(path: str) -> list:
+    """[mtime_ns, size, sha256] of a file"""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size, _file_hash(path)]
+
+
+def snapshot_path(oksfile: str) -> str:
+    """Location of the snapshot of a configuration in the daqconf cache directory"""
+    key = hashlib.sha1(os.path.realpath(oksfile).encode()).hexdigest()
+    return os.path.join(cache_dir(), "snapshots", f"{key}.snap")
+
+
+class SnapshotObject:
+    """Stand-in for a conffwk ConfigObject, as returned by Snapshot.get_obj"""
+
+    def __init__(self, class_name: str, uid: str, contained_in: str):
+        self._class_name = class_name
+        self._uid = uid
+        self._contained_in = contained_in
+
+    def UID(self):
+        return self._uid
+
+    def class_name(self):
+        return self._class_name
+
+    def contained_in(self):
+        return self._contained_in
+
+    def __repr__(self):
+        return f"<SnapshotObject {self._uid}@{self._class_name}>"
+
+
+class SnapshotDal:
+    """Read-only dal object backed by a snapshot.
+
+    One subclass is created per OKS class, carrying the class schema in
+    __schema__ like the conffwk dal classes. Attribute and relationship values
+    are decoded from the snapshot on first access.
+    """
+
+    __schema__ = {"attribute": {}, "relation": {}, "superclass": [], "subclass": []}
+    _oks_types = []
+
+    def __init__(self, snapshot: "Snapshot", uid: str):
+        self.__dict__["_snapshot"] = snapshot
+        self.__dict__["id"] = uid
+        self.__dict__["_values"] = None
+
+    def className(self):
+        return type(self).__name__
+
+    def oksTypes(self):
+        return self._oks_types
+
+    def isDalType(self, class_name: str) -> bool:
+        return class_name in self._oks_types
+
+    def fullName(self):
+        return f"{self.id}@{self.className()}"
+
+    def __getattr__(self, name):
+        schema = type(self).__schema__
+        if name not in schema["attribute"] and name not in schema["relation"]:
+            raise AttributeError(f"'{self.className()}' object has no attribute '{name}'")
+
+        values = self.__dict__["_values"]
+        if values is None:
+            values = self._snapshot._decode(self.className(), self.id)
+            self.__dict__["_values"] = values
+
+        value = values[name]
+        if name in schema["relation"]:
+            value = self._snapshot._resolve(value)
+        return value
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Snapshot objects are read-only")
+
+    def __eq__(self, other):
+        return isinstance(other, SnapshotDal) and self.className() == other.className() and self.id == other.id
+
+    def __hash__(self):
+        return hash((self.className(), self.id))
+
+    def __lt__(self, other):
+        return (self.className(), self.id) < (other.className(), other.id)
+
+    def __repr__(self):
+        return f"<{self.className()}: {self.id}>"
+
+
+class Snapshot:
+    """Read-only view of a configuration loaded from a snapshot file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a configuration snapshot")
+            header_length, = _LENGTH.unpack(f.read(_LENGTH.size))
+            header = pickle.loads(f.read(header_length))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if header.get("version") != _VERSION:
+            raise ValueError(f"{path} has an unsupported snapshot version")
+
+        self._path = path
+        self._blobs_offset = len(_MAGIC) + _LENGTH.size + header_length
+        self._header = header
+        self._schema = header["schema"]
+        # (class name, uid) -> (offset, length, file)
+        self._index = header["index"]
+        # uid -> class names of the objects with that uid
+        self._classes_of_uid = {}
+        for class_name, uid in self._index:
+            self._classes_of_uid.setdefault(uid, []).append(class_name)
+
+        self._dal_classes = {}
+        self._dals = {}
+        self._dals_of_class = {}
+
+    # ----- freshness -----
+
+    @property
+    def sources(self) -> dict:
+        """Files the snapshot was made from, as path : [mtime_ns, size, sha256]"""
+        return self._header["sources"]
+
+    @property
+    def includes(self) -> list:
+        """Includes of the configuration files, as (including file, include, resolved path)"""
+        return self._header["includes"]
+
+    @property
+    def active_database(self) -> str:
+        return self._header["top"]
+
+    @property
+    def databases(self) -> list:
+        return [self._header["top"]]
+
+    def is_fresh(self) -> bool:
+        """Check that the files the snapshot was made from are unchanged
+
+        Files whose content matches despite a different modification time
+        (e.g. touched or checked out again) get their new stats recorded in
+        the snapshot file, so that they are not hashed again on the next load.
+        """
+        if self._header["db_path"] != os.environ.get("DUNEDAQ_DB_PATH", ""):
+            return False
+        for parent, include, path in self.includes:
+            if resolve_db_path(include, os.path.dirname(parent)) != path:
+                return False
+        restated = {}
+        for path, (mtime_ns, size, sha256) in self.sources.items():
+            try:
+                st = os.stat(path)
+                if st.st_mtime_ns == mtime_ns and st.st_size == size:
+                    continue
+                if _file_hash(path) != sha256:
+                    return False
+                restated[path] = [st.st_mtime_ns, st.st_size, sha256]
+            except OSError:
+                return False
+
+        if restated:
+            self._header["sources"].update(restated)
+            try:
+                self._rewrite()
+            except OSError:
+                # Only costs the hashing again next time
+                pass
+        return True
+
+    def _rewrite(self) -> None:
+        """Write the snapshot file again with the current header, keeping the object blobs"""
+        header = pickle.dumps(self._header, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file = f"{self._path}.{os.getpid()}"
+        with open(tmp_file, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_LENGTH.pack(len(header)))
+            f.write(header)
+            f.write(self._mmap[self._blobs_offset:])
+        # The mapping of the replaced file stays valid
+        os.replace(tmp_file, self._path)
+
+    # ----- object decoding -----
+
+    def _decode(self, class_name: str, uid: str) -> dict:
+        offset, length, _ = self._index[(class_name, uid)]
+        start = self._blobs_offset + offset
+        return pickle.loads(self._mmap[start:start + length])
+
+    def _resolve(self, value):
+        """Turn relationship references into dal objects"""
+        if value is None:
+            return None
+        if isinstance(value, list):
+            return [self._resolve(v) for v in value]
+        return self.get_dal(*value)
+
+    def _dal_class(self, class_name: str) -> type:
+        dal_class = self._dal_classes.get(class_name)
+        if dal_class is None:
+            schema = self._schema[class_name]
+            dal_class = type(class_name, (SnapshotDal,), {
+                "__schema__": schema,
+                "_oks_types": [class_name] + list(schema["superclass"]),
+            })
+            self._dal_classes[class_name] = dal_class
+        return dal_class
+
+    def _find_class(self, class_name: str, uid: str) -> str:
+        """Actual class of the object uid, of class class_name or one of its subclasses"""
+        if (class_name, uid) in self._index:
+            return class_name
+        for candidate in self._classes_of_uid.get(uid, []):
+            if class_name in self._schema[candidate]["superclass"]:
+                return candidate
+        raise RuntimeError(f"Object {uid}@{class_name} not found in snapshot {self._path}")
+
+    # ----- conffwk.Configuration look-alike -----
+
+    def classes(self) -> list:
+        return list(self._schema)
+
+    def attributes(self, class_name: str, all: bool = True) -> dict:
+        return self._schema[class_name]["attribute"]
+
+    def relations(self, class_name: str, all: bool = True) -> dict:
+        return self._schema[class_name]["relation"]
+
+    def superclasses(self, class_name: str, all: bool = True) -> list:
+        return self._schema[class_name]["superclass"]
+
+    def subclasses(self, class_name: str, all: bool = True) -> list:
+        return self._schema[class_name]["subclass"]
+
+    def get_dal(self, class_name: str, uid: str):
+        class_name = self._find_class(class_name, uid)
+        key = (class_name, uid)
+        dal = self._dals.get(key)
+        if dal is None:
+            dal = self._dal_class(class_name)(self, uid)
+            self._dals[key] = dal
+        return dal
+
+    def get_dals(self, class_name: str) -> list:
+        """Objects of class_name or any of its subclasses"""
+        keys = self._dals_of_class.get(class_name)
+        if keys is None:
+            classes = {class_name, *self._schema.get(class_name, {}).get("subclass", [])}
+            keys = [key for key in self._index if key[0] in classes]
+            self._dals_of_class[class_name] = keys
+        return [self.get_dal(*key) for key in keys]
+
+    def get_all_dals(self) -> dict:
+        return {f"{uid}@{class_name}": self.get_dal(class_name, uid) for class_name, uid in self._index}
+
+    def get_obj(self, class_name: str, uid: str) -> SnapshotObject:
+        class_name = self._find_class(class_name, uid)
+        return SnapshotObject(class_name, uid, self._index[(class_name, uid)][2])
+
+    def get_objs(self, class_name: str) -> list:
+        return [self.get_obj(d.className(), d.id) for d in self.get_dals(class_name)]
+
+    def test_object(self, class_name: str, uid: str, *args) -> bool:
+        try:
+            self._find_class(class_name, uid)
+            return True
+        except RuntimeError:
+            return False
+
+    def __len__(self):
+        return len(self._index)
+
+
+def _reference(value):
+    """Snapshot representation of a relationship value"""
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [_reference(v) for v in value]
+    return (value.className(), value.id)
+
+
+def write_snapshot(db, oksfile: str, path: str = None) -> str:
+    """Write a snapshot of a configuration loaded with conffwk
+
+    Arguments:
+        db -- conffwk.Configuration loaded from oksfile
+        oksfile -- file the configuration was loaded from
+        path -- output file (default: snapshot_path(oksfile))
+
+    Returns:
+        path of the snapshot written
+
+    Raises:
+        FileNotFoundError if an include cannot be resolved: the snapshot could
+        not tell when the file appears
+    """
+    from daqconf.consolidate import IncludeGraph
+
+    if path is None:
+        path = snapshot_path(oksfile)
+
+    graph = IncludeGraph(db)
+    resolved = graph.resolve_paths(oksfile)
+    includes = []
+    sources = {resolved[None]: _file_signature(resolved[None])}
+    for file, parent in resolved.items():
+        for include in graph.includes(file):
+            include_path = resolve_db_path(include, os.path.dirname(parent))
+            if not os.path.isabs(include_path) or not os.path.isfile(include_path):
+                raise FileNotFoundError(f"Cannot resolve include {include} of {parent}, not writing a snapshot")
+            includes.append((parent, include, include_path))
+            if include_path not in sources:
+                sources[include_path] = _file_signature(include_path)
+
+    schema = {}
+    for class_name in db.classes():
+        schema[class_name] = {
+            "attribute": db.attributes(class_name, True),
+            "relation": db.relations(class_name, True),
+            "superclass": list(db.superclasses(class_name, True)),
+            "subclass": list(db.subclasses(class_name, True)),
+        }
+
+    index = {}
+    blobs = []
+    offset = 0
+    for dal in db.get_all_dals().values():
+        key = (dal.className(), dal.id)
+        if key in index:
+            continue
+        class_schema = schema[key[0]]
+        values = {a: getattr(dal, a) for a in class_schema["attribute"]}
+        values.update({r: _reference(getattr(dal, r)) for r in class_schema["relation"]})
+        blob = pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL)
+        index[key] = (offset, len(blob), db.get_obj(*key).contained_in())
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = pickle.dumps({
+        "version": _VERSION,
+        "top": os.path.realpath(oksfile),
+        "db_path": os.environ.get("DUNEDAQ_DB_PATH", ""),
+        "sources": sources,
+        "includes": includes,
+        "schema": schema,
+        "index": index,
+    }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = f"{path}.{os.getpid()}"
+    with open(tmp_file, "wb") as f:
+        f.write(_MAGIC)
+        f.write(_LENGTH.pack(len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_file, path)
+    return path
+
+
+def load_snapshot(oksfile: str):
+    """Return the snapshot of oksfile if there is an up to date one, None otherwise"""
+    try:
+        snapshot = Snapshot(snapshot_path(oksfile))
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+        return None
+    return snapshot if snapshot.is_fresh() else None
+
+
+def load_configuration(oksfile: str, use_snapshot: bool = True, verbose: bool = False):
+    """Open a configuration for read-only use
+
+    The snapshot of oksfile is used if it is up to date. Otherwise the
+    configuration is parsed with conffwk and a new snapshot is written, so
+    that the next call is fast.
+
+    Returns:
+        Snapshot, or conffwk.Configuration if use_snapshot is False or the
+        snapshot could not be written
+    """
+    import conffwk
+
+    start = time.perf_counter()
+    if use_snapshot:
+        snapshot = load_snapshot(oksfile)
+        if snapshot is not None:
+            if verbose:
+                print(f"Loaded snapshot of {oksfile} in {time.perf_counter() - start:.3f} s")
+            return snapshot
+
+    db = conffwk.Configuration("oksconflibs:" + oksfile)
+    if verbose:
+        print(f"Parsed {oksfile} in {time.perf_counter() - start:.3f} s")
+    if not use_snapshot:
+        return db
+
+    try:
+        return Snapshot(write_snapshot(db, oksfile))
+    except OSError as e:
+        # A read-only cache area only costs us the parsing next time
+        if verbose:
+            print(f"Snapshot not written: {e}")
+        return db
@@ -16,8 +16,16 @@ class ConfigurationHandler:
         # Load configuration
         self._configuration = self.__open_configuration(configuration_file_name)
         
-        # To be filled with ALL config objects (as DALs)
-        self._loaded_dals = []
+        # To be filled with ALL config objects (as DALs), keyed by (class name, uid)
+        self._loaded_dals = {}
+        # Class name -> {(class name, uid) : DAL} for the objects of that class or any of its subclasses
+        self._dals_by_type = {}
+        # List view of self._loaded_dals, rebuilt on demand after a change
+        self._dal_list = None
+        # Class name -> relationships of the class, as returned by conffwk
+        self._relations = {}
+        # Incremented every time objects or relationships in the configuration are changed
+        self._version = 0
         # Fills self._loaded_dals,
         self.__cache_all_conf_objects()
         
@@ -36,11 +44,31 @@ class ConfigurationHandler:
     def __cache_all_conf_objects(self)->None:
         """Adds all loaded dals to self._loaded_dals
         """
-        for conf_class in  self._configuration.classes():
-            for conf_obj in self._configuration.get_dals(conf_class):                
-                if conf_obj in self._loaded_dals: continue
-                
-                self._loaded_dals.append(conf_obj)
+        for conf_obj in self._configuration.get_all_dals().values():
+            self.__register(conf_obj)
+
+    @staticmethod
+    def __key(conf_obj):
+        return (conf_obj.className(), conf_obj.id)
+
+    def __register(self, conf_obj)->None:
+        """Add a dal to the registry and to the index of each of its classes"""
+        key = self.__key(conf_obj)
+        if key in self._loaded_dals: return
+
+        self._loaded_dals[key] = conf_obj
+        for conf_type in conf_obj.oksTypes():
+            self._dals_by_type.setdefault(conf_type, {})[key] = conf_obj
+        self._dal_list = None
+
+    def __unregister(self, conf_obj)->None:
+        """Remove a dal from the registry and the class indexes"""
+        key = self.__key(conf_obj)
+        if self._loaded_dals.pop(key, None) is None: return
+
+        for conf_type in conf_obj.oksTypes():
+            self._dals_by_type.get(conf_type, {}).pop(key, None)
+        self._dal_list = None
 
     #==============================  Getters + Setters ==============================#
     def get_relationships_for_conf_object(self, conf_object)->List[Any]:
@@ -76,7 +104,16 @@ class ConfigurationHandler:
         Returns:
             List of configuration objects of the given class
         """        
-        return self._configuration.get_dals(conf_class)
+        return list(self._dals_by_type.get(conf_class, {}).values())
+
+    def is_conf_object_of_class(self, conf_object, conf_class: str)->bool:
+        """Check whether a configuration object is of a given class or one of its subclasses
+
+        Arguments:
+            conf_object -- Any DAL object
+            conf_class -- Configuration class name
+        """
+        return self.__key(conf_object) in self._dals_by_type.get(conf_class, {})
         
     def get_all_conf_classes(self)->Dict[str, Any]:
         """Gets all classes + objects of that class in the configuration
@@ -96,7 +133,9 @@ class ConfigurationHandler:
         Returns:
             List of all related classses
         """        
-        return self._configuration.relations(class_id, True)
+        if class_id not in self._relations:
+            self._relations[class_id] = self._configuration.relations(class_id, True)
+        return self._relations[class_id]
         
     def get_inherited_classes(self, class_id: str)->List[str]:
         inherited_classes = [class_ for class_ in self._configuration.classes()\
@@ -121,7 +160,9 @@ class ConfigurationHandler:
     def conf_obj_list(self):
         """List of loaded in dals
         """        
-        return self._loaded_dals
+        if self._dal_list is None:
+            self._dal_list = list(self._loaded_dals.values())
+        return self._dal_list
     
     def get_obj(self, class_id: str, uid: str):
         """Get a particular configuration object 
@@ -143,6 +184,24 @@ class ConfigurationHandler:
         """        
         self.configuration.commit(update_message)
 
+    @property
+    def version(self)->int:
+        """Counter incremented on every change made through the handler to the objects
+        or their relationships, used to know when the relational structure is stale
+        """
+        return self._version
+
+    def update_dal(self, dal, relationships_changed: bool=True)->None:
+        """Write the changes made to a DAL object back to the configuration
+
+        Arguments:
+            dal -- modified DAL object
+            relationships_changed -- set to False if only attributes of the object were modified
+        """
+        self.configuration.update_dal(dal)
+        if relationships_changed:
+            self._version += 1
+
     @property
     def n_dals(self)->int:
         """Lists the total number of loaded objects
@@ -160,7 +219,8 @@ class ConfigurationHandler:
         self.configuration.create_obj(class_id, uid, at=self.configuration.active_database)
         config_as_dal = self.configuration.get_dal(class_id, uid)
         self.configuration.update_dal(config_as_dal)
-        self._loaded_dals.append(config_as_dal)
+        self.__register(config_as_dal)
+        self._version += 1
 
     def destroy_conf_obj(self, class_id: str, uid: str):
         """Destroy a configuration object
@@ -171,6 +231,7 @@ class ConfigurationHandler:
         """
         dal = self.configuration.get_dal(class_id, uid)
         self.configuration.destroy_dal(dal)
-        self._loaded_dals.remove(dal)
+        self.__unregister(dal)
+        self._version += 1
         
         
\ No newline at end of file
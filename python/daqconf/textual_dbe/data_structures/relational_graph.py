@@ -9,15 +9,13 @@ Current this is only really used to find "top level" objects
 
 '''
 
-import numpy as np
-from numpy.typing import NDArray
-from collections import deque
-
+from daqconf.graph_utils import topological_order
 from daqconf.textual_dbe.data_structures.configuration_handler import ConfigurationHandler
 
 class RelationalGraph:
     def __init__(self, config_handler: ConfigurationHandler):
-        """Construct relational graph
+        """Construct relational graph. The graph is rebuilt on first use after
+        the configuration handler reports a change
 
         Arguments:
             config_handler -- ConfigurationHandler object
@@ -28,97 +26,92 @@ class RelationalGraph:
         self.generate_graph()
         
     def generate_graph(self):
-        # Matrices etc. we require [maybe don't need to be defined at the constructor level, could be
-        # class methods]
-        self._topological_ordered_matrix = np.array([[]])
-
-        # Adjacency matrix has 1 for direct connection, 0 for no connection
-        self._adjacency_matrix = np.zeros((self._handler.n_dals, self._handler.n_dals))
+        # Version of the configuration the graph was built from
+        self._version = self._handler.version
+        # Map of (uid, class name) -> position of the DAL in the handler's object list
+        self._index = {}
+        # Sparse adjacency: for each node, dictionary of connected node -> number of connections
+        self._adjacency = {}
+        # Topological ordering of the nodes and cycles found in the graph
+        self._topological_order = None
         # Maximum distance from the "top level" to a given node
-        self._max_distance = np.zeros(self._handler.n_dals)-np.inf
+        self._max_distance = []
 
         # Generate the graph
-        self.__generate_adjacency_matrix()
+        self.__generate_adjacency()
         # Sort topologically and get longest paths
         self.__calculate_longest_paths()
 
-            
-    def __generate_adjacency_matrix(self):
-        """Generates adjacency matrix from configuration handler object i.e. finds connected DALs
+    def __ensure_current(self):
+        """Rebuild the graph if the configuration changed since it was generated"""
+        if self._version != self._handler.version:
+            self.generate_graph()
+
+    @staticmethod
+    def __key(dal):
+        return (dal.id, dal.className())
+
+    def __generate_adjacency(self):
+        """Generates the adjacency lists from configuration handler object i.e. finds connected DALs
         """
-        for i, dal in enumerate(self._handler.conf_obj_list):
+        dals = self._handler.conf_obj_list
+        self._index = {self.__key(dal): i for i, dal in enumerate(dals)}
+        self._adjacency = {i: {} for i in range(len(dals))}
+
+        for i, dal in enumerate(dals):
+            successors = self._adjacency[i]
             for connection_category in self._handler.get_relationships_for_conf_object(dal):
                 # Allows for multiply connected nodes
                 for connection in list(connection_category.values())[0]:
                     # Loop over just conf objects
-                    self._adjacency_matrix[i][self._handler.conf_obj_list.index(connection)] += 1
-                    
-    
-    def __compute_degree(self):
-        """Get number of incoming nodes for each node"""
-        return np.sum(self._adjacency_matrix !=0, axis=0)
-    
-    def __get_topological_order(self):
-        """
-        Topological sort of the adjacency graph
-        
-        Algorithm implementation roughly based on: https://en.wikipedia.org/wiki/Topological_sorting#Kahn's_algorithm
-        
-        """
-        in_degree = self.__compute_degree()
-        queue = deque(np.where(in_degree == 0)[0])
-        topological_ordering = []
-        
-        while queue:
-            node = queue.popleft()
-            # Add node to topological ordering
-            topological_ordering.append(node)
-            # Check out going edges
-            outgoing_edges = np.where(self._adjacency_matrix != 0)[0]
-            # Reduce the number of incoming edges for each outgoing edge
-            in_degree[outgoing_edges] -= 1
-            # Change the number of nodes with no outgoing edges
-            zero_in_degree_nodes = outgoing_edges[in_degree[outgoing_edges] == 0]
-            # Add to the queue
-            queue.extend(zero_in_degree_nodes)
-        
-        return topological_ordering
-    
-    def __update_distances(self, distance: NDArray, node_id: int):
-        """Update maximum distance to each node
+                    j = self._index[self.__key(connection)]
+                    successors[j] = successors.get(j, 0) + 1
 
-        Arguments:
-            distance -- List of distancezs to each node
-            node_id -- ID of a node
-        """        
-        outgoing_edges = np.where(self._adjacency_matrix[node_id] != 0)[0]
-        distance[outgoing_edges] = np.maximum(distance[outgoing_edges], distance[node_id] + self._adjacency_matrix[node_id][outgoing_edges])
-        
-    def __longest_path(self, start_id: int):
-        """Calculate the longest path in a DAG from the start node."""
-        dist = np.full(self._handler.n_dals, -np.inf)
-        dist[start_id] = 0
-
-        for u in self._topological_ordered_matrix:
-            if dist[u] != -np.inf:
-                self.__update_distances(dist, u)
-        return dist
-    
     def __calculate_longest_paths(self)->None:
         '''
-        Idea is to find shortest paths on -G for each top level node where G is the connection graph.
-        Layer each item lives on is then simply max(longest_path) for each top level item
+        Layer each item lives on is the length of the longest path reaching it, where each
+        connection counts with its multiplicity. Starting every node at 0 and relaxing the
+        outgoing connections in topological order gives that in a single pass. Each cycle is
+        treated as a single node: all of its members get the same layer and the connections
+        between them are ignored.
         '''
         
-        self._topological_ordered_matrix = self.__get_topological_order()
-        for node_id in range(self._handler.n_dals):
-            self._max_distance = np.maximum(self._max_distance, self.__longest_path(node_id))
+        self._topological_order = topological_order(self._adjacency)
+        cycles = self._topological_order.cycles
+        cycle_of = self._topological_order.cycle_of
+        settled_cycles = set()
+        distance = [0]*len(self._adjacency)
+        for node in self._topological_order.order:
+            node_cycle = cycle_of.get(node)
+            if node_cycle is not None and node_cycle not in settled_cycles:
+                # All connections from outside the cycle have been relaxed by now
+                cycle_distance = max(distance[member] for member in cycles[node_cycle])
+                for member in cycles[node_cycle]:
+                    distance[member] = cycle_distance
+                settled_cycles.add(node_cycle)
+            for successor, weight in self._adjacency[node].items():
+                if node_cycle is not None and cycle_of.get(successor) == node_cycle:
+                    continue
+                if distance[node] + weight > distance[successor]:
+                    distance[successor] = distance[node] + weight
 
-        self._max_distance = self._max_distance.astype(int)
+        self._max_distance = distance
+
+    @property
+    def topological_order(self):
+        """Configuration objects, each one after all of the objects referencing it"""
+        self.__ensure_current()
+        dals = self._handler.conf_obj_list
+        return [dals[i] for i in self._topological_order.order]
+
+    @property
+    def cycles(self):
+        """Groups of configuration objects that reference each other in a cycle"""
+        self.__ensure_current()
+        dals = self._handler.conf_obj_list
+        return [[dals[i] for i in cycle] for cycle in self._topological_order.cycles]
     
     @property
     def top_level_nodes(self):
+        self.__ensure_current()
         return [dal for i, dal in enumerate(self._handler.conf_obj_list) if self._max_distance[i]==0]
-    
-    
-    
\ No newline at end of file
@@ -11,16 +11,41 @@ class SelectionInterface(ABC):
     '''
     def __init__(self, config_handler: StructuredConfiguration):
         self._handler =  config_handler
+        # (class name, uid) -> children of the object, filled on demand
+        self._children_cache: dict = {}
         self._relational_dict: dict = self._build_relational_dict()
     
     def recompose(self)->None:
-        # Regenerates the GUI
+        # Regenerates the GUI. Only the top level is rebuilt, children are fetched again on demand
+        self._children_cache = {}
         self._relational_dict = self._build_relational_dict()
     
     @abstractmethod
     def _build_relational_dict(self):
         # Abstract method to be implemented by concrete classes
         return {}
+
+    def may_have_children(self, conf_obj)->bool:
+        """Whether the menu entry for an object can be expanded, without fetching its children"""
+        return False
+
+    def _get_children(self, conf_obj)->list:
+        # To be implemented by concrete classes with nested entries
+        return []
+
+    def children(self, conf_obj)->list:
+        """Children of a configuration object in the menu, cached until the next recompose
+
+        Arguments:
+            conf_obj -- Configuration object
+
+        Returns:
+            List of (category label, list of configuration objects)
+        """
+        key = (conf_obj.className(), conf_obj.id)
+        if key not in self._children_cache:
+            self._children_cache[key] = self._get_children(conf_obj)
+        return self._children_cache[key]
     
     @property
     def relationships(self):
@@ -44,32 +69,25 @@ class RelationalSelectionMenu(SelectionInterface):
     ''' Selection menu based on class relationships
     '''    
     def _build_relational_dict(self):                
-        configuration_dict = {f"[green]Sessions" : [self.__build_node(top_node) for top_node in self._handler.relational_graph.top_level_nodes if top_node.className() == "Session"],
-                        f"[green]Objects outside of Session" : [self.__build_node(top_node) for top_node in self._handler.relational_graph.top_level_nodes if top_node.className() != "Session"]}
+        top_level_nodes = self._handler.relational_graph.top_level_nodes
+        configuration_dict = {f"[green]Sessions" : [top_node for top_node in top_level_nodes if top_node.className() == "Session"],
+                        f"[green]Objects outside of Session" : [top_node for top_node in top_level_nodes if top_node.className() != "Session"]}
         
         return configuration_dict
+
+    def may_have_children(self, conf_obj)->bool:
+        return len(self._handler.configuration_handler.get_related_classes(conf_obj.className())) > 0
     
-    def __build_node(self, conf_obj):
-        """Build each node of the relational graph
+    def _get_children(self, conf_obj):
+        """Related objects of a configuration object, grouped by relationship
 
         Arguments:
             conf_obj -- Configuration object
         """        
-        
-        # We can deal with the schema
         relationships = self._handler.configuration_handler.get_relationships_for_conf_object(conf_obj)
-        
-        if not len(relationships):
-            return conf_obj
 
-        relations_list = []
-        for rel_category in relationships:
-            for rel_type, rel in rel_category.items():
-                # Bit slower but configuration isn't large enough for this to really matter]
-                relations_list.append({f"[blue]{rel_type}[/blue]": [self.__build_node(r) for r in rel]})
-            
-        
-        return {conf_obj: relations_list}
+        return [(f"[blue]{rel_type}[/blue]", rel)
+                for rel_category in relationships for rel_type, rel in rel_category.items()]
     
     def __repr__(self):
         return "RelationalSelectionMenu"
\ No newline at end of file
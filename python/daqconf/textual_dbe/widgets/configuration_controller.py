@@ -65,7 +65,9 @@ class ConfigurationController(Static):
         
         try:
             setattr(self._current_selected_object, attr_name, update_value)
-            self._handler.configuration_handler.configuration.update_dal(self._current_selected_object)        
+            handler = self._handler.configuration_handler
+            relationships_changed = attr_name in handler.get_related_classes(self._current_selected_object.className())
+            handler.update_dal(self._current_selected_object, relationships_changed)
         except Exception as _:
             self._logger.write_error(f"Could not update [yellow]{attr_name}[/yellow] to [yellow]{update_value}[/yellow] for {self.generate_rich_string(self._current_selected_object)}")
 
@@ -79,6 +81,11 @@ class ConfigurationController(Static):
             self._handler = StructuredConfiguration(file_name)
         except:
             self._logger.write_error(f"Could not load configuration from [bold yellow]{file_name}[/bold yellow]")
+            return
+
+        for cycle in self._handler.relational_graph.cycles:
+            self._logger.write("[yellow]WARNING:[/yellow] objects reference each other in a cycle: "
+                               + ", ".join(self.generate_rich_string(dal) for dal in cycle))
             
     @property
     def handler(self)->StructuredConfiguration | None:
@@ -167,7 +174,7 @@ class ConfigurationController(Static):
             self._logger.write_error("No object selected")
             return False
         
-        if self._current_selected_object not in self._handler.configuration_handler.get_all_conf_classes()['Component']:
+        if not self._handler.configuration_handler.is_conf_object_of_class(self._current_selected_object, 'Component'):
             self._logger.write_error(f"Cannot disable {self.generate_rich_string(self._current_selected_object)} must inherit from [red]Component[/red]!")
             return False
 
@@ -203,7 +210,7 @@ class ConfigurationController(Static):
                     session_disabled_elements.append(self._current_selected_object)
                 
             session.disabled = session_disabled_elements
-            self._handler.configuration_handler.configuration.update_dal(session)        
+            self._handler.configuration_handler.update_dal(session)
         self._logger.write("[red]=============================\n")
 
 
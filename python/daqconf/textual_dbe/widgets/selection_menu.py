@@ -1,5 +1,4 @@
 from typing import Any
-import numpy as np
 
 from textual.widgets import Static, Tree
 from textual.widgets.tree import TreeNode
@@ -16,7 +15,8 @@ class SelectionMenu(Static):
         yield self._tree
     
     def _build_tree(self):
-        """Iteratively builds tree via dictionary. This should be generated in SelectionInterface"""
+        """Builds the top level of the tree from the SelectionInterface. Deeper levels
+        are only added when a node is expanded"""
 
         # Grab current tree + config controller
         if self._tree is not None:
@@ -25,6 +25,8 @@ class SelectionMenu(Static):
         self._tree = Tree(f"File Browser:")
         main_screen = self.app.get_screen("main")
         self._controller = main_screen.query_one("ConfigurationController")
+        # Tree node ID -> (is_disabled, disabled_elements) for nodes whose children have not been added yet
+        self._unexpanded_nodes = {}
 
         # Loop over interfaces + make sure they're up to date with config
         for key, interface in self._controller.get_interface().items():
@@ -41,51 +43,51 @@ class SelectionMenu(Static):
         
         # Sort out the tree nodes to be alphabetical + loop overtop level noes  
         for key, branch in sorted(self._controller.get_interface()[self.id].relationships.items()):
+            # Skip empty categories
+            if len(branch)==0:
+                continue
             tree_node = tree_root.add(f"[green]{key}[/green]", expand=False)            
-            self.__build_tree_node(tree_node, branch, is_disabled=False, disabled_elements=[])
+            self.__add_conf_objects(tree_node, branch, is_disabled=False, disabled_elements=[])
         
 
-    def __build_tree_node(self, input_node: TreeNode, input_list: list, is_disabled: bool=False, disabled_elements: list=[]):
-        """Recursively build tree nodes from a list of dictionaries"""
-        
-        # Check if we need to remove the node since it's empty
-        if len(input_list)==0:
-            input_node.remove()
-
-        # Loop over the input list
-        for config_item in input_list:
-            # Check if it has sub-levels
-            if isinstance(config_item, dict):
-                # Print the DAL name
-                config_key = list(config_item.keys())[0]
-                config_objects = list(config_item.values())[0]
-
-                # Need to be able to add categories so check if it's just a string
-                if isinstance(config_key, str):
-                    item_disabled = is_disabled
-                    dal_str = config_key
-                    stored_data=None #
-
-                else: 
-                    if config_key.className() == "Session":
-                        disabled_elements = config_key.disabled
-                        # Remove the ResourceBase object since it just doubly defines disabled items
-                
-                    # Check if the item is disabled
-                    item_disabled = self.__check_item_disabled(config_key, disabled_elements) or is_disabled
-                    
-                    dal_str = self._controller.generate_rich_string(config_key, item_disabled)
-                    stored_data = config_key
-                
-                # Bit confusing, set ensure we're not multiply defining things in the tree,
-                # for example disabled items in a session may also be defined elsewhere
-                tree_node = input_node.add(dal_str, data=stored_data)
-                self.__build_tree_node(tree_node, config_objects, item_disabled, disabled_elements)
-                                
+    def __add_conf_objects(self, input_node: TreeNode, conf_objects: list, is_disabled: bool=False, disabled_elements: list=[]):
+        """Add a list of configuration objects below a tree node. Objects that may have
+        children get an expandable node, populated when it is first expanded"""
+        interface = self._controller.get_interface()[self.id]
+
+        for conf_obj in conf_objects:
+            obj_disabled_elements = disabled_elements
+            if conf_obj.className() == "Session":
+                obj_disabled_elements = conf_obj.disabled
+
+            # Check if the item is disabled
+            item_disabled = self.__check_item_disabled(conf_obj, obj_disabled_elements) or is_disabled
+            dal_str = self._controller.generate_rich_string(conf_obj, item_disabled)
+
+            if interface.may_have_children(conf_obj):
+                tree_node = input_node.add(dal_str, data=conf_obj, expand=False)
+                self._unexpanded_nodes[tree_node.id] = (item_disabled, obj_disabled_elements)
             else:
                 # No sub-levels, just add the leaf
-                item_disabled = self.__check_item_disabled(config_item, disabled_elements) or is_disabled
-                input_node.add_leaf(self._controller.generate_rich_string(config_item, item_disabled), data=config_item)
+                input_node.add_leaf(dal_str, data=conf_obj)
+
+    def on_tree_node_expanded(self, event):
+        """Add the children of a configuration object the first time its node is expanded"""
+        node_state = self._unexpanded_nodes.pop(event.node.id, None)
+        if node_state is None:
+            return
+
+        item_disabled, disabled_elements = node_state
+        interface = self._controller.get_interface()[self.id]
+        for rel_label, rel_objects in interface.children(event.node.data):
+            # Remove empty relationships
+            if len(rel_objects)==0:
+                continue
+            rel_node = event.node.add(rel_label, expand=False)
+            self.__add_conf_objects(rel_node, rel_objects, item_disabled, disabled_elements)
+
+        if len(event.node.children)==0:
+            event.node.allow_expand = False
 
     def on_tree_node_selected(self, event):
         # Selector
@@ -1,19 +1,237 @@
 import os
+import re
 import glob
+import json
+import fnmatch
+import bisect
 
-def find_oksincludes(includes:list[str], extra_dirs:list[str] = []):
+
+def cache_dir() -> str:
+    """Directory used by daqconf to persist caches between invocations"""
+    base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "daqconf")
+
+
+class OksIncludeIndex:
+    """Index of the OKS xml files available under a list of search directories.
+
+    Every search directory is walked once (down to max_depth levels) and the
+    relative paths of the xml files found are stored, together with the mtime
+    of each directory visited. The index is persisted in the daqconf cache
+    directory: on the next use only the directories whose mtime has changed
+    are listed again, so include resolution becomes a set lookup instead of a
+    series of glob calls.
+    """
+
+    _VERSION = 1
+
+    def __init__(self, searchdirs: list[str], cache_file: str = None, max_depth: int = 4):
+        self._searchdirs = [os.path.abspath(d) if d else os.path.abspath(".") for d in searchdirs]
+        self._cache_file = cache_file if cache_file is not None else os.path.join(cache_dir(), "oks_include_index.json")
+        self._max_depth = max_depth
+        # root -> { reldir : [mtime_ns, [subdirs], [xml files]] }
+        self._dirs = {}
+        # root -> set of xml file paths relative to root
+        self._paths = {}
+        # root -> { file name : [paths relative to root] }
+        self._by_name = {}
+        # root -> sorted file names, for prefix lookups
+        self._names = {}
+        self._load()
+        self.refresh()
+
+    def _load(self):
+        try:
+            with open(self._cache_file) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get("version") != self._VERSION or cached.get("max_depth") != self._max_depth:
+            return
+        for root in self._searchdirs:
+            if root in cached["roots"]:
+                self._dirs[root] = cached["roots"][root]
+
+    def _save(self):
+        try:
+            with open(self._cache_file) as f:
+                cached = json.load(f)
+            if cached.get("version") != self._VERSION or cached.get("max_depth") != self._max_depth:
+                raise ValueError
+        except (OSError, ValueError):
+            cached = {"version": self._VERSION, "max_depth": self._max_depth, "roots": {}}
+        cached["roots"].update({root: self._dirs[root] for root in self._dirs})
+
+        try:
+            os.makedirs(os.path.dirname(self._cache_file), exist_ok=True)
+            tmp_file = f"{self._cache_file}.{os.getpid()}"
+            with open(tmp_file, "w") as f:
+                json.dump(cached, f)
+            os.replace(tmp_file, self._cache_file)
+        except OSError:
+            # A read-only cache area only costs us a rescan next time
+            pass
+
+    def _refresh_root(self, root: str) -> bool:
+        """Update the index of one search directory, listing only the
+        directories that changed since the last scan"""
+        old_dirs = self._dirs.get(root, {})
+        new_dirs = {}
+        changed = False
+        visited = set()
+
+        stack = [("", 0)]
+        while stack:
+            reldir, depth = stack.pop()
+            path = os.path.join(root, reldir)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            # Guard against symlink loops
+            if (st.st_dev, st.st_ino) in visited:
+                continue
+            visited.add((st.st_dev, st.st_ino))
+
+            entry = old_dirs.get(reldir)
+            if entry is None or entry[0] != st.st_mtime_ns:
+                subdirs, files = [], []
+                try:
+                    with os.scandir(path) as it:
+                        for de in it:
+                            try:
+                                if de.is_dir():
+                                    subdirs.append(de.name)
+                                elif de.name.endswith(".xml"):
+                                    files.append(de.name)
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
+                entry = [st.st_mtime_ns, sorted(subdirs), sorted(files)]
+                changed = True
+            new_dirs[reldir] = entry
+
+            if depth < self._max_depth:
+                for sub in entry[1]:
+                    stack.append((f"{reldir}/{sub}" if reldir else sub, depth + 1))
+
+        changed |= (new_dirs.keys() != old_dirs.keys())
+        self._dirs[root] = new_dirs
+        if changed or root not in self._paths:
+            self._paths[root] = {f"{d}/{f}" if d else f for d, entry in new_dirs.items() for f in entry[2]}
+            by_name = {}
+            for path in self._paths[root]:
+                by_name.setdefault(path.rpartition("/")[2], []).append(path)
+            self._by_name[root] = by_name
+            self._names[root] = sorted(by_name)
+        return changed
+
+    def refresh(self):
+        """Bring the index up to date with the content of the search directories"""
+        changed = False
+        for root in self._searchdirs:
+            changed |= self._refresh_root(root)
+        if changed:
+            self._save()
+
+    @staticmethod
+    def _match(pattern_parts: list[str], path: str) -> bool:
+        # Same semantics as glob: wildcards never match across '/'
+        parts = path.split("/")
+        return len(parts) == len(pattern_parts) and all(fnmatch.fnmatchcase(p, pp) for p, pp in zip(parts, pattern_parts))
+
+    def find(self, root: str, pattern: str) -> list[str]:
+        """Paths relative to root matching the glob-style pattern"""
+        root = os.path.abspath(root) if root else os.path.abspath(".")
+        pattern_parts = pattern.split("/")
+        if (root not in self._paths or len(pattern_parts) > self._max_depth + 1
+                or os.path.isabs(pattern) or any(p in ("", ".", "..") for p in pattern_parts)):
+            # Outside of the indexed area, or not in the normalised form of the indexed paths
+            return sorted(glob.glob(pattern, root_dir=root))
+
+        paths = self._paths[root]
+        if not glob.has_magic(pattern):
+            return [pattern] if pattern in paths else []
+
+        # Only the file names sharing the literal prefix of the name pattern
+        # can match, e.g. 'foo.data.xml' and 'foo.schema.xml' for 'foo*.xml'
+        name_pattern = pattern_parts[-1]
+        prefix = re.split(r"[*?\[]", name_pattern, maxsplit=1)[0]
+        if not prefix:
+            return sorted(p for p in paths if self._match(pattern_parts, p))
+        names = self._names[root]
+        candidates = []
+        for name in names[bisect.bisect_left(names, prefix):]:
+            if not name.startswith(prefix):
+                break
+            if fnmatch.fnmatchcase(name, name_pattern):
+                candidates += self._by_name[root][name]
+        return sorted(p for p in candidates if self._match(pattern_parts, p))
+
+    @property
+    def searchdirs(self) -> list[str]:
+        return self._searchdirs
+
+
+def resolve_db_path(file: str, parent_dir: str) -> str:
+    """Absolute path of an included database file, looked up like OKS does:
+    relative to the including file, then in the DUNEDAQ_DB_PATH directories.
+    The file name is returned unchanged if it cannot be found."""
+    if os.path.isabs(file):
+        candidates = [file]
+    else:
+        candidates = [os.path.join(parent_dir, file)]
+        candidates += [os.path.join(d, file) for d in os.environ.get("DUNEDAQ_DB_PATH", "").split(":") if d]
+
+    for candidate in candidates:
+        if os.path.isfile(candidate):
+            return os.path.realpath(candidate)
+    return file
+
+
+_include_indexes = {}
+
+
+def get_include_index(searchdirs: list[str]) -> OksIncludeIndex:
+    """Return the (refreshed) include index for the given search directories"""
+    key = tuple(searchdirs)
+    index = _include_indexes.get(key)
+    if index is None:
+        index = OksIncludeIndex(searchdirs)
+        _include_indexes[key] = index
+    else:
+        index.refresh()
+    return index
+
+
+def find_oksincludes(includes:list[str], extra_dirs:list[str] = [], data_dirs:list[str] = ["config", "data"], all_matches:bool = False):
+    """Look up include files in DUNEDAQ_DB_PATH and extra_dirs
+
+    Arguments:
+        data_dirs -- sub directories searched for .data includes
+        all_matches -- add every file matching an include, instead of the first one
+
+    Returns:
+        [True, include files] or [False, []] if an include could not be found
+    """
     includefiles = []
 
+    if isinstance(extra_dirs, str):
+        extra_dirs = [extra_dirs]
+
     searchdirs = [path for path in os.environ["DUNEDAQ_DB_PATH"].split(":")]
     for dir in extra_dirs:
         searchdirs.append(dir)
 
+    index = get_include_index(searchdirs)
+
     for inc in includes:
         # print (f"Searching for {inc}")
         match = False
         inc = inc.removesuffix(".xml")
         if inc.endswith(".data"):
-            sub_dirs = ["config", "data"]
+            sub_dirs = data_dirs
         elif inc.endswith(".schema"):
             sub_dirs = ["schema"]
         else:
@@ -21,32 +239,22 @@ def find_oksincludes(includes:list[str], extra_dirs:list[str] = []):
             inc = inc + "*"
         for path in searchdirs:
             # print (f"   {path}/{inc}.xml")
-            matches = glob.glob(f"{inc}.xml", root_dir=path)
+            matches = index.find(path, f"{inc}.xml")
             if len(matches) == 0:
                 for search_dir in sub_dirs:
                     # print (f"   {path}/{search_dir}/{inc}.xml")
-                    matches = glob.glob(f"{search_dir}/{inc}.xml", root_dir=path)
-                    for filename in matches:
-                        if filename not in includefiles:
-                            print(f"Adding {filename} to include list")
-                            includefiles.append(filename)
-                        #else:
-                        #    print(f"{filename} already in include list")
-                        match = True
-                        break
-                    if match:
+                    matches = index.find(path, f"{search_dir}/{inc}.xml")
+                    if len(matches) > 0:
                         break
-                if match:
-                    break
-            else:
-                for filename in matches:
+            if len(matches) > 0:
+                for filename in (matches if all_matches else matches[:1]):
                     if filename not in includefiles:
                         print(f"Adding {filename} to include list")
                         includefiles.append(filename)
                     #else:
                     #    print(f"{filename} already in include list")
-                    match = True
-                    break
+                match = True
+                break
 
         if not match:
             print(f"Error could not find include file for {inc}")
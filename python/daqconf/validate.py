@@ -1,5 +1,7 @@
 import conffwk
-import confmodel
+
+from daqconf.dal_helpers import dal_content_key
+from daqconf.session import SessionIndex, SessionState
 
 
 def compare_objects(obj1, obj2):
@@ -31,18 +33,23 @@ def compare_objects(obj1, obj2):
 
 
 
-def check_unique_relationship(objects, relationship):
+def check_unique_relationship(objects, relationship, verbose=False):
   """
   Check to see if the given relationship (by class name) is unique
   among a list of objects. First by comparing the UIDs, then by
   comparing the values within.
+
+  Values already seen are indexed by UID and by content key (dal_content_key),
+  so each new value is checked in constant time. Only problems are
+  reported unless verbose is set.
   """
 
-  seen = []
   seen_id = {}
+  seen_content = {}
   unique = True
   for obj in objects:
-    print(f"Checking {obj.id}")
+    if verbose:
+      print(f"Checking {obj.id}")
     rel = obj.get(relationship)
     if len(rel) < 1:
       print(f"No object found for relationship {relationship} in {obj.id}")
@@ -53,29 +60,31 @@ def check_unique_relationship(objects, relationship):
         print (
           f"ERROR {obj.id}:  {val.className()} {val.id} already seen in {seen_id[val.id]}")
         unique = False
+        continue
+
+      fingerprint = dal_content_key(val)
+      if fingerprint in seen_content:
+        print (f"object {obj.id} {val.id} is same as {seen_content[fingerprint].id}")
+        unique = False
       else:
-        for other in seen:
-          #print (f"  Checking {val.id}=={other.id}?")
-          if compare_objects(val, other):
-            print (f"object {obj.id} {val.id} is same as {other.id}")
-            unique = False
-      if not unique:
-        break
-      seen.append(val)
+        seen_content[fingerprint] = val
       seen_id[val.id] = obj.id
   return unique
 
 
-def validate_readout(db, session):
+def validate_readout(db, session, verbose=False):
   errcount = 0
   # Find all enabled readout apps and check that
   # DetectorToDaqConnection's are unique
   ru_apps = []
-  for app in confmodel.session_get_all_applications(db._obj, session.id):
-    if confmodel.component_disabled(db._obj, session.id, app.id):
+  state = SessionState(session)
+  ru_ids = set()
+  for app in SessionIndex(session).apps:
+    if state.is_disabled(app) or app.id in ru_ids:
       continue
-    if app.class_name == "ReadoutApplication":
-      ru_apps.append(db.get_dal(app.class_name, app.id))
+    if app.className() == "ReadoutApplication":
+      ru_ids.add(app.id)
+      ru_apps.append(app)
   if len(ru_apps) == 0:
     print(f"No enabled readout applicatios in session")
     errcount += 1
@@ -113,7 +122,7 @@ def validate_readout(db, session):
           for snd_res in d2d_res.contains:
             if "DetDataSender" in snd_res.oksTypes():
               if snd_res.id in senders_seen:
-                print(f"Error sender {snd_res.id} already seen in {senders_seen[d2d_res.id]}")
+                print(f"Error sender {snd_res.id} already seen in {senders_seen[snd_res.id]}")
                 errcount += 1
                 continue
               senders_seen[snd_res.id] = d2d.id
@@ -135,11 +144,11 @@ def validate_readout(db, session):
       errcount += 1
 
   print (f"\nChecking data senders for duplicate streams");
-  if not check_unique_relationship(snd_dals, "DetectorStream"):
+  if not check_unique_relationship(snd_dals, "DetectorStream", verbose):
     errcount += 1
 
   print (f"\nChecking detector connections for duplicate geio ids")
-  if not check_unique_relationship(d2d_dals, "GeoId"):
+  if not check_unique_relationship(d2d_dals, "GeoId", verbose):
     errcount += 1
 
   print (f"Session {session.id} readout validated with {errcount} errors:"+
@@ -148,7 +157,7 @@ def validate_readout(db, session):
 
   return errcount
 
-def validate_session(oksfile, session_name):
+def validate_session(oksfile, session_name, verbose=False):
   db = conffwk.Configuration("oksconflibs:" + oksfile)
   if session_name == "":
     session_dals = db.get_dals(class_name="Session")
@@ -167,5 +176,5 @@ def validate_session(oksfile, session_name):
       return
 
   print(f"Validating session {session.id}:")
-  errcount = validate_readout(db, session)
+  errcount = validate_readout(db, session, verbose)
   print (f"\nSession {session.id} validated with {errcount} errors")
@@ -0,0 +1,56 @@
+"""Tests of the content hash comparison of daqconf.diff, run with pytest"""
+import pytest
+
+from daqconf.diff import diff_configurations
+
+
+class FakeDal:
+    """Minimal dal object: a class name, an id and schema driven members"""
+
+    def __init__(self, class_name, uid, attributes=None, relations=None):
+        self._class_name = class_name
+        self.id = uid
+        attributes = attributes or {}
+        relations = relations or {}
+        self.__schema__ = {"attribute": {a: {} for a in attributes}, "relation": {r: {} for r in relations},
+                           "superclass": [], "subclass": []}
+        for name, value in {**attributes, **relations}.items():
+            setattr(self, name, value)
+
+    def className(self):
+        return self._class_name
+
+
+class FakeDb:
+
+    def __init__(self, dals):
+        self._dals = {f"{d.id}@{d.className()}": d for d in dals}
+
+    def get_all_dals(self):
+        return self._dals
+
+    def get_dal(self, class_name, uid):
+        return self._dals[f"{uid}@{class_name}"]
+
+
+def _session_db(source_ids):
+    streams = [FakeDal("DetectorStream", uid, {"source_id": sid}) for uid, sid in zip("ab", source_ids)]
+    resources = FakeDal("ResourceSetAND", "set", relations={"contains": streams})
+    session = FakeDal("Session", "s", relations={"segment": resources})
+    return FakeDb(streams + [resources, session])
+
+
+def test_swapped_contents_are_reported_in_session_diff():
+    old, new = _session_db([1, 2]), _session_db([2, 1])
+    expected = [("DetectorStream", "a"), ("DetectorStream", "b")]
+    assert sorted(diff_configurations(old, new).modified) == expected
+    assert sorted(diff_configurations(old, new, "s").modified) == expected
+
+
+def test_identical_session_has_no_differences():
+    assert not diff_configurations(_session_db([1, 2]), _session_db([1, 2]), "s")
+
+
+def test_unknown_session_is_an_error():
+    with pytest.raises(RuntimeError):
+        diff_configurations(_session_db([1, 2]), _session_db([1, 2]), "missing")
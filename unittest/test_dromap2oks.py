@@ -0,0 +1,68 @@
+"""Tests of the streaming readout map parsing of dromap2oks, run with pytest"""
+import io
+import json
+import random
+
+import pytest
+
+from daqconf.dromap2oks import iter_json_array, group_readout_map, EthReceiver
+
+CHUNK_SIZES = (1, 2, 3, 7)
+
+DOCUMENTS = [
+    '[]',
+    ' [ ] ',
+    '[1.5]',
+    '[1e5, -2.25E-3, 0, 10]',
+    '[ 1 , 22,333 ,{"a":[1,2]}, "x]y", true, null ]',
+    '[{"src_id": 12, "geo_id": {"det_id": 3}, "x": 1.0e+2}]\n',
+]
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("document", DOCUMENTS)
+def test_iter_json_array_matches_json_loads(document, chunk_size):
+    assert list(iter_json_array(io.StringIO(document), chunk_size)) == json.loads(document)
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_json_array_random_numbers(chunk_size):
+    rng = random.Random(chunk_size)
+    values = [rng.choice([rng.randint(-10**6, 10**6), rng.uniform(-1e6, 1e6), rng.uniform(0, 1) * 10**rng.randint(-20, 20)])
+              for _ in range(200)]
+    document = json.dumps(values)
+    assert list(iter_json_array(io.StringIO(document), chunk_size)) == json.loads(document)
+
+
+@pytest.mark.parametrize("document", ['[1 2]', '{"a": 1}', '[1,'])
+def test_iter_json_array_errors(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(document), 2))
+
+
+def _eth(src_id, rx, tx, tx_host="tx-host"):
+    return {"src_id": src_id, "geo_id": {"det_id": 3, "crate_id": 1, "slot_id": 0, "stream_id": src_id}, "kind": "eth",
+            "parameters": {"rx_mac": rx, "rx_ip": "10.0.0.1", "rx_host": f"host-{rx}",
+                           "tx_mac": tx, "tx_ip": "10.0.1.1", "tx_host": tx_host}}
+
+
+def _flx(src_id, card, slr):
+    return {"src_id": src_id, "geo_id": {"det_id": 3, "crate_id": 1, "slot_id": 0, "stream_id": src_id}, "kind": "flx",
+            "parameters": {"card": card, "slr": slr, "protocol": "full", "link": src_id}}
+
+
+def test_group_readout_map_rejects_split_rx_nic():
+    with pytest.raises(RuntimeError):
+        list(group_readout_map([_eth(0, "rx0", "tx0"), _eth(1, "rx1", "tx1"), _eth(2, "rx0", "tx2")]))
+
+
+def test_group_readout_map_rejects_split_felix_slr():
+    with pytest.raises(RuntimeError):
+        list(group_readout_map([_flx(0, 1, 0), _flx(1, 1, 1), _flx(2, 1, 0)]))
+
+
+def test_group_readout_map_reuses_tx_nic_name():
+    groups = list(group_readout_map([_eth(0, "rx0", "tx0"), _eth(1, "rx1", "tx0"), _eth(2, "rx1", "tx1")]))
+    senders = [s for g in groups if isinstance(g, EthReceiver) for s in g.senders]
+    assert [s.nic_name for s in senders] == ["nw-tx-host-0", "nw-tx-host-0", "nw-tx-host-1"]
+    assert [s.link_id for s in senders] == [0, 1, 2]
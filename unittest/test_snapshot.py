@@ -0,0 +1,63 @@
+"""Tests of the freshness checks of daqconf.snapshot, run with pytest"""
+import os
+
+import pytest
+
+from daqconf.snapshot import load_snapshot, write_snapshot
+
+
+class FakeDb:
+    """Configuration without objects, only an include hierarchy"""
+
+    def __init__(self, includes):
+        self._includes = includes
+
+    def get_includes(self, file=None):
+        return self._includes.get(file, [])
+
+    def classes(self):
+        return []
+
+    def get_all_dals(self):
+        return {}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    db_path = tmp_path / "db_path"
+    db_path.mkdir()
+    monkeypatch.setenv("DUNEDAQ_DB_PATH", str(db_path))
+    top_dir = tmp_path / "top"
+    top_dir.mkdir()
+    top = top_dir / "top.data.xml"
+    top.write_text("<top/>")
+    (db_path / "inc.data.xml").write_text("<inc/>")
+    return top, FakeDb({None: ["inc.data.xml"], "inc.data.xml": []})
+
+
+def test_snapshot_is_fresh(config):
+    top, db = config
+    write_snapshot(db, str(top))
+    assert load_snapshot(str(top)) is not None
+
+
+def test_shadowing_include_makes_snapshot_stale(config):
+    top, db = config
+    write_snapshot(db, str(top))
+    (top.parent / "inc.data.xml").write_text("<shadow/>")
+    assert load_snapshot(str(top)) is None
+
+
+def test_unresolved_include_is_not_snapshotted(config):
+    top, _ = config
+    with pytest.raises(FileNotFoundError):
+        write_snapshot(FakeDb({None: ["missing.data.xml"]}), str(top))
+
+
+def test_touched_file_stats_are_recorded(config):
+    top, db = config
+    write_snapshot(db, str(top))
+    os.utime(top, ns=(1, 1))
+    assert load_snapshot(str(top)) is not None
+    assert load_snapshot(str(top)).sources[str(top.resolve())][0] == 1
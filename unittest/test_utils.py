@@ -0,0 +1,45 @@
+"""Tests of the include file lookup of daqconf.utils, run with pytest"""
+import os
+
+import pytest
+
+from daqconf.utils import OksIncludeIndex, find_oksincludes
+
+
+@pytest.fixture
+def db_tree(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    root = tmp_path / "db"
+    for path in ("data/a.data.xml", "data/ab.data.xml", "config/a.data.xml", "schema/a.schema.xml"):
+        (root / path).parent.mkdir(parents=True, exist_ok=True)
+        (root / path).touch()
+    other = tmp_path / "other" / "b.data.xml"
+    other.parent.mkdir()
+    other.touch()
+    monkeypatch.setenv("DUNEDAQ_DB_PATH", str(root))
+    return root, other
+
+
+def test_find_wildcards(db_tree):
+    root, _ = db_tree
+    index = OksIncludeIndex([str(root)], cache_file=str(root.parent / "index.json"))
+    assert index.find(str(root), "*/a*.xml") == ["config/a.data.xml", "data/a.data.xml", "data/ab.data.xml", "schema/a.schema.xml"]
+    assert index.find(str(root), "data/a.data.xml") == ["data/a.data.xml"]
+    assert index.find(str(root), "data/missing.data.xml") == []
+
+
+def test_find_paths_outside_index(db_tree):
+    root, other = db_tree
+    index = OksIncludeIndex([str(root)], cache_file=str(root.parent / "index.json"))
+    assert index.find(str(root), str(other)) == [str(other)]
+    assert index.find(str(root), "./data/a.data.xml") == ["./data/a.data.xml"]
+    assert index.find(str(root), "../other/b.data.xml") == ["../other/b.data.xml"]
+
+
+def test_find_oksincludes_absolute_and_relative(db_tree):
+    root, other = db_tree
+    assert find_oksincludes([str(other)]) == [True, [str(other)]]
+    assert find_oksincludes(["../other/b.data.xml"]) == [True, ["../other/b.data.xml"]]
+    assert find_oksincludes(["a.data"]) == [True, ["config/a.data.xml"]]
+    assert find_oksincludes(["a.data"], data_dirs=["data"], all_matches=True) == [True, ["data/a.data.xml"]]
+    assert find_oksincludes(["missing.data"])[0] is False